@@ -1,3 +1,3 @@
 __version__ = "1.4.5"
 from halo_model import HaloModel
-from integrate_corr import ProjectedCF, AngularCF
+from integrate_corr import ProjectedCF, AngularCF, TomographicCF
@@ -5,6 +5,7 @@ Created on Oct 1, 2013
 '''
 import numpy as np
 import sys
+from scipy.interpolate import InterpolatedUnivariateSpline as spline
 from hmf._framework import Component
 _allmodels = ["ST", "seljak", 'ma', 'tinker05', 'tinker10']
 
@@ -20,10 +21,15 @@ class Bias(Component):
 
     All subclasses must implement the method ``bias``, which returns the Bias
     function at `nu` or `m`.
+
+    Any model parameter may be given as an array, in which case the bias is
+    evaluated for each of its values at once (all array-valued parameters must
+    have the same length, nparam). The parameters then broadcast against `nu`
+    and `m`, so that ``bias`` returns an array of shape (nparam, nm).
     """
     _defaults = {}
     def __init__(self, nu, delta_c, m = None,mstar=None,delta_halo=None, n=None,
-                 Om0=None,sigma_8=None,h=None,**model_parameters):
+                 Om0=None,sigma_8=None,h=None,z=0.0,**model_parameters):
         self.nu = nu
         self.n = n
         self.delta_c = delta_c
@@ -35,9 +41,23 @@ class Bias(Component):
         self.h = h
         self.Om0 = Om0
         self.sigma_8 = sigma_8
+        self.z = z
 
         super(Bias, self).__init__(**model_parameters)
 
+        self.nparam = None
+        for k, v in self.params.items():
+            if np.ndim(v) > 0:
+                if self.nparam is not None and len(v) != self.nparam:
+                    raise ValueError("All array-valued bias parameters must have the same length")
+                self.nparam = len(v)
+                self.params[k] = np.asarray(v, dtype=float)[:, np.newaxis]
+
+        if self.nparam is not None:
+            self.nu = np.atleast_1d(self.nu)[np.newaxis, :]
+            if self.m is not None:
+                self.m = np.atleast_1d(self.m)[np.newaxis, :]
+
     def bias(self):
         return np.ones_like(self.nu)
 
@@ -202,33 +222,47 @@ class Tinker10_PBsplit(Bias):
 
     delta_virs = np.array([200, 300, 400, 600, 800, 1200, 1600, 2400, 3200])
 
-    def bias(self):
-        if self.delta_halo not in self.delta_virs:
-            beta_array = np.array([self.params["beta_%s" % d] for d in self.delta_virs])
-            gamma_array = np.array([self.params["gamma_%s" % d] for d in self.delta_virs])
-            phi_array = np.array([self.params["phi_%s" % d] for d in self.delta_virs])
-            eta_array = np.array([self.params["eta_%s" % d] for d in self.delta_virs])
-
-            beta_func = spline(self.delta_virs, beta_array)
-            gamma_func = spline(self.delta_virs, gamma_array)
-            phi_func = spline(self.delta_virs, phi_array)
-            eta_func = spline(self.delta_virs, eta_array)
-
-            beta_0 = beta_func(self.delta_halo)
-            gamma_0 = gamma_func(self.delta_halo)
-            phi_0 = phi_func(self.delta_halo)
-            eta_0 = eta_func(self.delta_halo)
-        else:
-            beta_0 = self.params['beta_%s' % (int(self.delta_halo))]
-            gamma_0 = self.params['gamma_%s' % (int(self.delta_halo))]
-            phi_0 = self.params['phi_%s' % (int(self.delta_halo))]
-            eta_0 = self.params['eta_%s' % (int(self.delta_halo))]
-
-        beta = beta_0 * (1 + min(self.z, self.params["max_z"])) ** self.params["beta_exp"]
-        phi = phi_0 * (1 + min(self.z, self.params["max_z"])) ** self.params['phi_exp']
-        eta = eta_0 * (1 + min(self.z, self.params["max_z"])) ** self.params['eta_exp']
-        gamma = gamma_0 * (1 + min(self.z, self.params["max_z"])) ** self.params['gamma_exp']
+    # Cubic-spline basis functions over delta_virs, built once and shared by all
+    # instances. Since a spline is linear in its data, the coefficients at any
+    # delta_halo are a weighted sum of their tabulated values.
+    _basis = None
+
+    # The coefficients for this instance, see :meth:`coefficients`.
+    _coeffs = None
+
+    @classmethod
+    def _delta_weights(cls, delta_halo):
+        if cls._basis is None:
+            eye = np.eye(len(cls.delta_virs))
+            cls._basis = [spline(cls.delta_virs, e) for e in eye]
+        return [b(delta_halo.flatten()).reshape(delta_halo.shape) for b in cls._basis]
+
+    def coefficients(self):
+        """
+        The coefficients beta, gamma, phi and eta at `delta_halo` and `z`.
+
+        Either of `delta_halo` and `z` may be an array, in which case they index
+        the leading axis of the bias (as array-valued parameters do).
+        """
+        if self._coeffs is None:
+            delta_halo = np.asarray(self.delta_halo, dtype=float)
+            z = np.asarray(self.z, dtype=float)
+            if delta_halo.ndim:
+                delta_halo = delta_halo.reshape((-1, 1))
+            if z.ndim:
+                z = z.reshape((-1, 1))
+
+            w = self._delta_weights(delta_halo)
+            zfac = 1 + np.minimum(z, self.params["max_z"])
+
+            self._coeffs = []
+            for name in ["beta", "gamma", "phi", "eta"]:
+                c0 = sum(wi*self.params["%s_%s" % (name, d)] for wi, d in zip(w, self.delta_virs))
+                self._coeffs.append(c0 * zfac ** self.params["%s_exp" % name])
+        return self._coeffs
 
+    def bias(self):
+        beta, gamma, phi, eta = self.coefficients()
         return 1 + (gamma*self.nu - (1+2*eta))/self.delta_c + 2*phi/self.delta_c/(1+(beta**2 * self.nu)**phi)
 
 class ScaleDepBias(Component):
@@ -4,12 +4,13 @@ Created on 08/12/2014
 @author: Steven
 '''
 from scipy.interpolate import interp1d
+from scipy.interpolate import InterpolatedUnivariateSpline as spline
 import numpy as np
 from hmf._framework import Component
-from scipy.optimize import minimize
 import warnings
 from scipy import special as sp
 from scipy.optimize import fsolve
+from tools import LRUCache
 
 
 class CMRelation(Component):
@@ -37,6 +38,12 @@ class CMRelation(Component):
         Critical density for collapse
         Used in ``Bullock01``
 
+    sigma_table : tuple of arrays, optional
+        The mass variance at z=0 as ``(lnr, lnsig)``, if it has already been
+        calculated (eg. :attr:`HaloModel.sigma_table`). It is used to seed the
+        cached table of the mass variance, which is then only extended (by
+        integrating over `filter0`) where it does not cover the radii required.
+
     mstar : float, optional
         The nonlinear mass at the desired redshift.
         If not provided, will be calculated if required.
@@ -50,8 +57,25 @@ class CMRelation(Component):
     _defaults = {}
 
     use_cosmo = False
+
+    # Range and resolution (points per decade) of the tabulated mass variance.
+    _sigma_rmin = 1e-3
+    _sigma_rmax = 1e2
+    _sigma_res = 50
+
+    # Tables shared between instances, and therefore between redshifts, keyed
+    # by the state of the filter or growth function they are derived from. Only
+    # the most recently used are kept.
+    _sigma_tables = LRUCache(16)
+    _growth_tables = LRUCache(16)
+
+    # Whether to interpolate c(m, z) from a cached CMTable, rather than calculate
+    # it directly. This is only worthwhile for expensive relations.
+    tabulate = False
+    _cm_tables = LRUCache(4)
+
     def __init__(self, filter0=None, mean_density0=None, growth=None,delta_c=1.686,
-                 profile=None, cosmo=None, delta_halo=200.0,
+                 profile=None, cosmo=None, delta_halo=200.0, sigma_table=None,
                  **model_parameters):
         # Save instance variables
         self.filter = filter0
@@ -64,25 +88,198 @@ class CMRelation(Component):
         self.cosmo = cosmo
         super(CMRelation, self).__init__(**model_parameters)
 
+        if sigma_table is not None and self.filter is not None:
+            key = self._filter_key()
+            if key not in self._sigma_tables:
+                lnr, lnsig = sigma_table
+                self._sigma_tables[key] = (lnr, lnsig, spline(lnr, lnsig))
+
+    def _filter_key(self):
+        return (self.filter.__class__, tuple(sorted(self.filter.params.items())),
+                hash(np.asarray(self.filter.k).tobytes()),
+                hash(np.asarray(self.filter.power).tobytes()))
+
+    def _growth_key(self):
+        return (self.growth.__class__, tuple(sorted(self.growth.params.items())),
+                repr(self.growth.cosmo))
+
+    def _cm_key(self):
+        key = (self.__class__, tuple(sorted(self.params.items())),
+               self.delta_c, self.delta_halo, self.mean_density0)
+        if self.filter is not None:
+            key += self._filter_key()
+        if self.growth is not None:
+            key += self._growth_key()
+        if self.profile is not None:
+            key += (self.profile.__class__, tuple(sorted(self.profile.params.items())))
+        if self.cosmo is not None:
+            key += (repr(self.cosmo),)
+        return key
+
+    @property
+    def table(self):
+        """
+        The :class:`CMTable` of this relation, cached per model, parameters and
+        cosmology (so that it is rebuilt whenever any of these change).
+        """
+        key = self._cm_key()
+        if key not in self._cm_tables:
+            self._cm_tables[key] = CMTable(self)
+        return self._cm_tables[key]
+
+    def concentration(self, m, z=0):
+        """
+        The concentration of halos of mass `m` at redshift `z`.
+
+        This is interpolated from :attr:`table` if :attr:`tabulate` is True,
+        otherwise it is equivalent to :meth:`cm`.
+        """
+        if self.tabulate:
+            return self.table(m, z)
+        return self.cm(m, z)
+
+    def _sigma_table(self, rmin=None, rmax=None):
+        """
+        The mass variance at z=0, tabulated on a log-spaced grid of radii.
+
+        Parameters
+        ----------
+        rmin, rmax : float, optional
+            The range of radii required. The table is extended if it does not
+            yet cover them.
+
+        Returns
+        -------
+        lnr, lnsig : array_like
+            The log radius and the log of the mass variance.
+
+        spl : callable
+            A spline of lnsig as a function of lnr.
+        """
+        key = self._filter_key()
+        rmin = min(rmin or self._sigma_rmin, self._sigma_rmin)
+        rmax = max(rmax or self._sigma_rmax, self._sigma_rmax)
+
+        if key in self._sigma_tables:
+            lnr, lnsig = self._sigma_tables[key][:2]
+            if lnr[0] <= np.log(rmin) and lnr[-1] >= np.log(rmax):
+                return self._sigma_tables[key]
+
+            # Only integrate over the power where the table must be extended.
+            dlnr = np.log(10)/self._sigma_res
+            lo = np.arange(lnr[0] - dlnr, np.log(rmin) - dlnr, -dlnr)[::-1]
+            hi = np.arange(lnr[-1] + dlnr, np.log(rmax) + dlnr, dlnr)
+            new = np.log(self.filter.sigma(np.exp(np.concatenate((lo, hi)))))
+            lnsig = np.concatenate((new[:len(lo)], lnsig, new[len(lo):]))
+            lnr = np.concatenate((lo, lnr, hi))
+        else:
+            nr = int(np.ceil(np.log10(rmax/rmin)*self._sigma_res)) + 1
+            lnr = np.linspace(np.log(rmin), np.log(rmax), nr)
+            lnsig = np.log(self.filter.sigma(np.exp(lnr)))
+
+        self._sigma_tables[key] = (lnr, lnsig, spline(lnr, lnsig))
+        return self._sigma_tables[key]
+
+    def _sigma(self, r):
+        """The mass variance at z=0, interpolated from the cached table."""
+        r = np.asarray(r, dtype=float)
+        spl = self._sigma_table(r.min(), r.max())[2]
+        return np.exp(spl(np.log(r.flatten()))).reshape(r.shape)
+
+    def _growth_fn(self, inverse=False):
+        """
+        The growth factor as a function of redshift (or the inverse), cached
+        per cosmology.
+        """
+        key = self._growth_key() + (inverse,)
+        if key not in self._growth_tables:
+            self._growth_tables[key] = self.growth.growth_factor_fn(inverse=inverse)
+        return self._growth_tables[key]
+
     def mass_nonlinear(self,z):
         """
         Return the nonlinear mass at z.
 
+        The mass variance is tabulated once per cosmology, and inverted by
+        interpolation, so that this is cheap for any number of redshifts.
+
         Parameters
         ----------
-        z : float
-            Redshift. Must not be an array.
+        z : float or array_like
+            Redshift(s).
         """
-        model = lambda lnr : (self.filter.sigma(np.exp(lnr))*self.growth.growth_factor(z) - self.delta_c)**2
+        lnr, lnsig = self._sigma_table()[:2]
+        lnsig_nl = np.log(self.delta_c/self._growth_fn()(z))
 
-        res = minimize(model,[1.0,])
+        if np.any(lnsig_nl < lnsig.min()) or np.any(lnsig_nl > lnsig.max()):
+            warnings.warn("Nonlinear mass is outside the tabulated range of radii")
 
-        if res.success:
-            r = np.exp(res.x[0])
-            return self.filter.radius_to_mass(r,self.mean_density0) #TODO *(1+z)**3 ????
-        else:
-            warnings.warn("Minimization failed :(")
-            return 0
+        # The mass variance decreases with radius.
+        r = np.exp(np.interp(lnsig_nl, lnsig[::-1], lnr[::-1]))
+        m = self.filter.radius_to_mass(r,self.mean_density0) #TODO *(1+z)**3 ????
+
+        if np.isscalar(z):
+            return float(m)
+        return m
+
+class CMTable(object):
+    """
+    A concentration-mass relation tabulated in mass and redshift.
+
+    The relation is tabulated on a log-spaced grid of masses, at redshift nodes
+    separated by `dz`, each of which is calculated only when first required.
+    Concentrations are then splined in log mass, and linearly interpolated in
+    redshift. Masses outside the table are calculated directly.
+
+    Parameters
+    ----------
+    cm_relation : :class:`CMRelation` instance
+        The relation to tabulate.
+
+    mmin, mmax : float, optional
+        Range of masses in the table.
+
+    res : int, optional
+        Number of masses per decade.
+
+    dz : float, optional
+        Separation of the redshift nodes.
+    """
+    def __init__(self, cm_relation, mmin=1e3, mmax=1e18, res=20, dz=0.05):
+        self.cm_relation = cm_relation
+        self.lnm = np.linspace(np.log(mmin), np.log(mmax), int(np.ceil(np.log10(mmax/mmin)*res)) + 1)
+        self.dz = dz
+        self._nodes = {}
+
+    def _node(self, i):
+        if i not in self._nodes:
+            c = self.cm_relation.cm(np.exp(self.lnm), i*self.dz)
+            self._nodes[i] = spline(self.lnm, np.log(c))
+        return self._nodes[i]
+
+    def __call__(self, m, z=0):
+        """
+        Concentrations of halos of mass `m` (float or array) at redshift `z` (float).
+        """
+        m = np.asarray(m, dtype=float)
+        lnm = np.log(m.flatten())
+
+        t = z/self.dz
+        i = int(np.floor(t + 1e-8))
+        t = max(t - i, 0)
+
+        lnc = self._node(i)(lnm)
+        if t > 1e-8:
+            lnc = (1 - t)*lnc + t*self._node(i + 1)(lnm)
+        c = np.exp(lnc)
+
+        out = np.logical_or(lnm < self.lnm[0], lnm > self.lnm[-1])
+        if np.any(out):
+            c[out] = self.cm_relation.cm(m.flatten()[out], z)
+
+        if m.ndim == 0:
+            return c[0]
+        return c.reshape(m.shape)
 
 #class NFW(CMRelation):
 #    _defaults = {'f':,"k":}
@@ -92,9 +289,8 @@ class Bullock01(CMRelation):
 
     def zc(self,m,z=0):
         r = self.filter.mass_to_radius(self.params["F"]*m,self.mean_density0)
-        nu = self.filter.nu(r,self.delta_c)
-        g = self.growth.growth_factor_fn(inverse=True)
-        zc = g(np.sqrt(nu))
+        g = self._growth_fn(inverse=True)
+        zc = g(self.delta_c/self._sigma(r))
         zc[zc < z] = z  # hack?
         return zc
 
@@ -117,6 +313,8 @@ class Zehavi11(Bullock01_Power):
 
 class Ludlow2016(CMRelation):
     ## Note: only defined for NFW for now.
+    ## Set `tabulate` to True to interpolate c(m, z) from a CMTable (to ~1e-3).
+
     _defaults = {"f":0.02, ## Fraction of mass assembled at "formation"
                  "C":650   ## Constant scaling
                 }
@@ -144,30 +342,39 @@ class Ludlow2016(CMRelation):
 
         lhs = self.profile._h(1)/self.profile._h(cvec)
 
-        rf = self.filter.mass_to_radius(f*m, self.mean_density0)
-        r = self.filter.mass_to_radius(m, self.mean_density0)
-        sigf = self.filter.sigma(rf)**2
-        sigr = self.filter.sigma(r)**2
+        m_arr = np.atleast_1d(m)
+        rf = self.filter.mass_to_radius(f*m_arr, self.mean_density0)
+        r = self.filter.mass_to_radius(m_arr, self.mean_density0)
+        sigf = self._sigma(rf)**2
+        sigr = self._sigma(r)**2
 
-        gf = self.growth.growth_factor_fn()
+        gf = self._growth_fn()
         num = (self.delta_c*(1./gf(zf) - 1./gf(z)))
         den = np.sqrt(2*(sigf - sigr))
-        rhs = sp.erfc(np.outer(num,1./den))
+
+        # Scan along cvec for the first point at which lhs - rhs becomes positive,
+        # for all masses at once, keeping only the current and previous values
+        # in memory. Note that lhs - rhs is also positive at c=1 (where lhs=1),
+        # which is not a solution.
+        out = np.zeros(len(m_arr)) + np.nan
+        prev = lhs[0] - sp.erfc(num[0]/den)
+        for i in range(1, len(cvec)):
+            this = lhs[i] - sp.erfc(num[i]/den)
+            root = np.logical_and(np.isnan(out), np.logical_and(prev <= 0, this > 0))
+            out[root] = cvec[i-1] + (cvec[i] - cvec[i-1])*prev[root]/(prev[root] - this[root])
+            prev = this
+
+            if not np.any(np.isnan(out)):
+                break
+
+        # Where there is no solution, the root lies beyond the range of cvec.
+        nosol = np.isnan(out)
+        out[np.logical_and(nosol, prev > 0)] = cvec.min()
+        out[np.logical_and(nosol, prev <= 0)] = cvec.max()
 
         if np.isscalar(m):
-            rhs = rhs[:,0]
-            spl = interp1d(lhs-rhs,cvec)
-            return spl(0.0)
-        else:
-            out = np.zeros_like(m)
-            for i in range(len(m)):
-                arg = lhs - rhs[:,i]
-                if np.sum(arg<=0)==0:
-                    out[i] = cvec.min()
-                else:
-                    spl = interp1d(arg,cvec)
-                    out[i] = spl(0.0)
-            return out
+            return out[0]
+        return out
 
 
     def cm(self,m,z=0):
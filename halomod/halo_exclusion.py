@@ -4,6 +4,7 @@ Module defining halo model components for halo exclusion.
 
 # Imports
 import numpy as np
+from copy import copy
 from hmf._framework import Component
 from cached_property import cached_property
 from scipy import integrate as intg
@@ -172,10 +173,32 @@ class Exclusion(Component):
         """
         pass
 
+    def integrate_cross(self, other):
+        """
+        The equivalent of :meth:`integrate` for the cross-correlation of two samples
+        in the same haloes, where `other` is an instance of the same model for the
+        second sample.
+
+        Since :meth:`integrate` is quadratic in `I`, the cross term is found by
+        polarisation, re-using any geometry (eg. `mask` or `prob`) already
+        calculated by this instance.
+        """
+        plus, minus = copy(self), copy(self)
+        plus.I = self.I + other.I
+        minus.I = self.I - other.I
+        return (plus.integrate() - minus.integrate())/4.0
+
 
 class NoExclusion(Exclusion):
+    @cached_property
+    def _integral(self):
+        return intg.simps(self.raw_integrand(),dx=self.dlnx)
+
     def integrate(self):
-        return intg.simps(self.raw_integrand(),dx=self.dlnx)**2
+        return self._integral**2
+
+    def integrate_cross(self, other):
+        return self._integral*other._integral
 
 
 class Sphere(Exclusion):
@@ -202,10 +225,17 @@ class Sphere(Exclusion):
     def mlim(self):
         return 4*np.pi*(self.r/2)**3 * self.mean_density * self.delta_halo/3
 
-    def integrate(self):
+    @cached_property
+    def _integral(self):
         integ = self.raw_integrand() #r,k,m
         integ.transpose((1,0,2))[:,self.mask] = 0
-        return intg.simps(integ,dx=self.dlnx)**2
+        return intg.simps(integ,dx=self.dlnx)
+
+    def integrate(self):
+        return self._integral**2
+
+    def integrate_cross(self, other):
+        return self._integral*other._integral
 
 
 class DblSphere(Sphere):
@@ -232,9 +262,13 @@ class DblSphere(Sphere):
         integ = self.raw_integrand() #(r,k,m)
         return integrate_dblsphere(integ,self.mask,self.dlnx)
 
+    def integrate_cross(self, other):
+        # This is a double integral, rather than the square of a single integral.
+        return Exclusion.integrate_cross(self, other)
+
 def integrate_dblsphere(integ,mask,dx):
     out = np.zeros_like(integ[:,:,0])
-    integrand = np.zeros_like(mask)
+    integrand = np.zeros(mask.shape)
     for ik in range(integ.shape[1]):
         for ir in range(mask.shape[0]):
             integrand[ir] = np.outer(integ[ir,ik,:],integ[ir,ik,:])
@@ -387,10 +421,17 @@ class NgMatched(DblEllipsoid):
         return np.where(cumint>1.0001*np.outer(self.density_mod,np.ones_like(self.m)),
                         np.ones_like(cumint,dtype=bool),np.zeros_like(cumint,dtype=bool))
 
-    def integrate(self):
+    @cached_property
+    def _integral(self):
         integ = self.raw_integrand() #r,k,m
         integ.transpose((1,0,2))[:,self.mask] = 0
-        return intg.simps(integ,dx=self.dlnx)**2
+        return intg.simps(integ,dx=self.dlnx)
+
+    def integrate(self):
+        return self._integral**2
+
+    def integrate_cross(self, other):
+        return self._integral*other._integral
 
 if USE_NUMBA:
     class NgMatched_(DblEllipsoid_):
@@ -403,10 +444,17 @@ if USE_NUMBA:
             return np.where(cumint>1.0001*np.outer(self.density_mod,np.ones_like(self.m)),
                             np.ones_like(cumint,dtype=bool),np.zeros_like(cumint,dtype=bool))
 
-        def integrate(self):
+        @cached_property
+        def _integral(self):
             integ = self.raw_integrand() #r,k,m
             integ.transpose((1,0,2))[:,self.mask] = 0
-            return intg.simps(integ,dx=self.dlnx)**2
+            return intg.simps(integ,dx=self.dlnx)
+
+        def integrate(self):
+            return self._integral**2
+
+        def integrate_cross(self, other):
+            return self._integral*other._integral
 
 def cumsimps(func,dx):
     """
@@ -42,6 +42,16 @@ class HaloModel(MassFunction):
     r : array_like, optional, default ``np.logspace(-2.0,1.5,100)``
         The scales at which the correlation function is calculated in Mpc/*h*
 
+    hod_mmin_prior : float, optional
+        The smallest (log10) mass that the HOD may require, eg. the lower bound of the prior
+        on its minimum mass in a fit. If lower than `Mmin`, the mass grid is extended down to
+        it, so that updating the HOD never requires the mass function to be recomputed.
+
+    hod_samples : list, optional
+        Further galaxy samples, for cross-correlations (see eg. :meth:`power_gg_cross`).
+        Each is either a dictionary of parameters of `hod_model`, or an instance of
+        :class:`~hod.HOD`.
+
     **kwargs: anything that can be used in the MassFunction class
 
     '''
@@ -55,7 +65,7 @@ class HaloModel(MassFunction):
                  sd_bias_model="Tinker_SD05", sd_bias_params={},
                  exclusion_model="NgMatched", exclusion_params={},
                  hc_spectrum="nonlinear", ng=None, Mmin=0, Mmax=18,
-                 force_1halo_turnover=True,
+                 force_1halo_turnover=True, hod_mmin_prior=None, hod_samples=None,
                  **hmf_kwargs):
 
         super(HaloModel, self).__init__(Mmin=Mmin, Mmax=Mmax, **hmf_kwargs)
@@ -74,6 +84,8 @@ class HaloModel(MassFunction):
         self.rnum = rnum
         self.hc_spectrum = hc_spectrum
         self.force_1halo_turnover = force_1halo_turnover
+        self.hod_mmin_prior = hod_mmin_prior
+        self.hod_samples = hod_samples
         # A special argument, making it possible to define M_min by mean density
         self.ng = ng
 
@@ -124,6 +136,13 @@ class HaloModel(MassFunction):
         """Dictionary of parameters for the HOD model"""
         return val
 
+    @parameter("param")
+    def hod_samples(self, val):
+        """List of further HODs (dictionaries of parameters, or instances), for cross-correlations"""
+        if val is not None and not all(isinstance(h, (dict, hod.HOD)) for h in val):
+            raise ValueError("hod_samples must be a list of dictionaries or hod.HOD instances")
+        return val
+
     @parameter("model")
     def hod_model(self, val):
         """:class:`~hod.HOD` class"""
@@ -213,6 +232,11 @@ class HaloModel(MassFunction):
     def force_1halo_turnover(self,val):
         return bool(val)
 
+    @parameter("res")
+    def hod_mmin_prior(self, val):
+        """The smallest log10 mass the HOD may require (or None)"""
+        return val
+
     # ===========================================================================
     # Basic Quantities
     # ===========================================================================
@@ -239,6 +263,8 @@ class HaloModel(MassFunction):
     def m(self):
         if self.Mmax < 17:
             warnings.warn("Mmax is less than 10^17 Msun/h, so integrations *may not* converge")
+        if self.hod_mmin_prior is not None and self.hod_mmin_prior < self.Mmin:
+            return 10 ** np.arange(self.hod_mmin_prior, self.Mmax, self.dlog10m)
         return 10 ** np.arange(self.Mmin, self.Mmax, self.dlog10m)
 
     @cached_quantity
@@ -246,38 +272,169 @@ class HaloModel(MassFunction):
         """
         A galaxy mask -- i.e. a mask on mass which restricts the range to those where galaxies exist
         for the given HOD.
+
+        Since this is always a contiguous upper range of masses, it is a slice, so that indexing with it
+        returns views rather than copies. It never changes the mass grid itself (which would require
+        recomputing every mass-dependent quantity part-way through a calculation): if the HOD requires
+        masses below the grid, an error is raised, and `Mmin` or `hod_mmin_prior` should be lowered.
         """
-        if self.hod.mmin is None:
-            return self.m >= self.m.min()
+        return self._mass_slice(self.hod.mmin)
 
-        if self.Mmin > self.hod.mmin:
-            warnings.warn("Internal Mmin larger than required by HOD, setting lower.")
-            self.update(Mmin=self.hod.mmin)
+    def _mass_slice(self, mmin):
+        "The slice of `m` above 10**mmin (all of it, if `mmin` is None)"
+        if mmin is None:
+            return slice(0, None)
 
-        return self.m >= 10 ** self.hod.mmin
+        # Truncating the galaxy integrals at the edge of the grid would silently bias them.
+        if np.log10(self.m[0]) > mmin + 1e-8:
+            raise ValueError("HOD requires masses down to 10^%s, below the mass grid (10^%s). "
+                             "Set Mmin or hod_mmin_prior lower." % (mmin, np.log10(self.m[0])))
 
+        return slice(np.searchsorted(self.m, 10 ** mmin), None)
+
+    # Views of mass-dependent quantities restricted to the galaxy mask, shared by all galaxy statistics.
     @cached_quantity
-    def bias(self):
-        """A class containing the elements necessary to calculate the halo bias"""
+    def _gm_m(self):
+        return self.m[self._gm]
+
+    @cached_quantity
+    def _gm_dndm(self):
+        return self.dndm[self._gm]
+
+    @cached_quantity
+    def _gm_bias(self):
+        return self.bias[self._gm]
+
+    @cached_quantity
+    def _gm_n_cen(self):
+        return self.n_cen[self._gm]
+
+    @cached_quantity
+    def _gm_n_sat(self):
+        return self.n_sat[self._gm]
+
+    @cached_quantity
+    def _gm_n_tot(self):
+        return self.n_tot[self._gm]
+
+    @cached_quantity
+    def _gm_ss_pairs(self):
+        return self.hod.ss_pairs(self._gm_m)
+
+    @cached_quantity
+    def _gm_cs_pairs(self):
+        return self.hod.cs_pairs(self._gm_m)
+
+    @cached_quantity
+    def _gm_ukm(self):
+        return self.profile_ukm[:, self._gm]
+
+    @cached_quantity
+    def _gm_rho(self):
+        return self.profile_rho[:, self._gm]
+
+    @cached_quantity
+    def _gm_lam(self):
+        return self.profile_lam[:, self._gm]
+
+    # ===========================================================================
+    # Mass variance interpolation
+    # ===========================================================================
+    # The mass variance is integrated over the power spectrum once (in `_sigma_0`),
+    # and everything else -- bias, concentration, the nonlinear mass and power_hh
+    # -- interpolates it from here.
+    @cached_quantity
+    def sigma_table(self):
+        """
+        The z=0 mass variance tabulated on the radii of `m`, as ``(lnr, lnsig)``.
+        """
+        return np.log(self.radii), np.log(self._sigma_0)
+
+    @cached_quantity
+    def _sigma_spline(self):
+        return spline(*self.sigma_table)
+
+    def sigma_of_m(self, m):
+        """
+        The mass variance at `z`, interpolated to arbitrary masses `m`.
+        """
+        m = np.asarray(m, dtype=float)
+        r = self.filter.mass_to_radius(m.flatten(), self.mean_density0)
+        return np.exp(self._sigma_spline(np.log(r))).reshape(m.shape)*self.growth_factor
+
+    def nu_of_m(self, m):
+        """
+        The peak height, (delta_c/sigma)^2, at `z`, interpolated to arbitrary masses `m`.
+        """
+        return (self.delta_c/self.sigma_of_m(m)) ** 2
+
+    @cached_quantity
+    def mass_nonlinear(self):
+        """
+        The nonlinear mass, nu(Mstar) = 1, by inversion of :attr:`sigma_table`.
+        """
+        lnr, lnsig = self.sigma_table
+        lnsig_nl = np.log(self.delta_c/self.growth_factor)
+        if lnsig_nl < lnsig.min() or lnsig_nl > lnsig.max():
+            warnings.warn("Nonlinear mass outside mass range")
+            # The c(m) relation extends its copy of the table as necessary.
+            return self.cm.mass_nonlinear(self.z)
+
+        # The mass variance decreases with radius.
+        r = np.exp(np.interp(lnsig_nl, lnsig[::-1], lnr[::-1]))
+        return self.filter.radius_to_mass(r, self.mean_density0)
+
+    def _get_bias_model(self, m=None, **bias_params):
+        """
+        An instance of the bias model, with given parameters.
+
+        If `m` is given, the model is set up at those masses (with `nu` from
+        :meth:`nu_of_m`) rather than at `.m`.
+        """
+        if m is None:
+            m, nu = self.m, self.nu
+        else:
+            nu = self.nu_of_m(m)
 
         if issubclass_(self.bias_model, bias.Bias):
-            return self.bias_model(nu=self.nu, delta_c=self.delta_c,
-                                   m=self.m, mstar=self.mass_nonlinear,
-                                   delta_halo=self.delta_halo, n=self.n, Om0=self.cosmo.Om0,
-                                   h=self.cosmo.h, sigma_8=self.sigma_8,
-                                   **self.bias_params).bias()
+            model = self.bias_model
+            mstar = self.mass_nonlinear
         else:
+            model = get_model_(self.bias_model, "halomod.bias")
             # FIXME: this is an ugly hack just to get things fast for the paper.
             if self.bias_model in ["Jing98", "Seljak04"]:
                 mstar = self.mass_nonlinear
             else:
                 mstar = None
-            return get_model(self.bias_model, "halomod.bias",
-                             nu=self.nu, delta_c=self.delta_c,
-                             m=self.m, mstar=mstar,
-                             delta_halo=self.delta_halo, n=self.n, Om0=self.cosmo.Om0,
-                             h=self.cosmo.h, sigma_8=self.sigma_8,
-                             **self.bias_params).bias()
+
+        return model(nu=nu, delta_c=self.delta_c,
+                     m=m, mstar=mstar,
+                     delta_halo=self.delta_halo, n=self.n, Om0=self.cosmo.Om0,
+                     h=self.cosmo.h, sigma_8=self.sigma_8, z=self.z,
+                     **bias_params)
+
+    @cached_quantity
+    def bias(self):
+        """A class containing the elements necessary to calculate the halo bias"""
+        return self._get_bias_model(**self.bias_params).bias()
+
+    def bias_batch(self, **bias_params):
+        """
+        The halo bias for many sets of bias model parameters at once.
+
+        Parameters
+        ----------
+        bias_params :
+            Parameters of the bias model, any of which may be arrays (of the same
+            length, nparam). Unspecified parameters are taken from :attr:`bias_params`.
+
+        Returns
+        -------
+        bias : array_like, shape (nparam, nm)
+            The bias for each set of parameters.
+        """
+        params = dict(self.bias_params, **bias_params)
+        return np.atleast_2d(self._get_bias_model(**params).bias())
 
     @cached_quantity
     def cm(self):
@@ -290,12 +447,14 @@ class HaloModel(MassFunction):
             return self.concentration_model(filter0=this_filter, mean_density0=self.mean_density0,
                                             growth=self.growth, delta_c=self.delta_c, profile=this_profile,
                                             cosmo=self.cosmo, delta_halo=self.delta_halo,
+                                            sigma_table=self.sigma_table,
                                             **self.concentration_params)
         else:
             return get_model(self.concentration_model, "halomod.concentration",
                              filter0=this_filter, mean_density0=self.mean_density0,
                              growth=self.growth, delta_c=self.delta_c, profile=this_profile,
                              cosmo=self.cosmo, delta_halo=self.delta_halo,
+                             sigma_table=self.sigma_table,
                              **self.concentration_params)
 
     @cached_quantity
@@ -303,7 +462,7 @@ class HaloModel(MassFunction):
         """
         The concentrations corresponding to `.m`
         """
-        return self.cm.cm(self.m, self.z)
+        return self.cm.concentration(self.m, self.z)
 
     @cached_quantity
     def profile(self):
@@ -379,7 +538,7 @@ class HaloModel(MassFunction):
         This is always the *integrated* density. If `ng` is supplied to the constructor,
         that value can be found as :meth:`.ng`. It should be very close to this value.
         """
-        integrand = self.m[self._gm]*self.dndm[self._gm]*self.n_tot[self._gm]
+        integrand = self._gm_m*self._gm_dndm*self._gm_n_tot
         return intg.trapz(integrand, dx=np.log(self.m[1]/self.m[0]))
 
     @cached_quantity
@@ -388,7 +547,7 @@ class HaloModel(MassFunction):
         The galaxy number weighted halo bias factor (Tinker 2005)
         """
         # Integrand is just the density of galaxies at mass m by bias
-        integrand = self.m[self._gm]*self.dndm[self._gm]*self.n_tot[self._gm]*self.bias[self._gm]
+        integrand = self._gm_m*self._gm_dndm*self._gm_n_tot*self._gm_bias
         b = intg.trapz(integrand, dx=np.log(self.m[1]/self.m[0]))
         return b/self.mean_gal_den
 
@@ -398,7 +557,7 @@ class HaloModel(MassFunction):
         Average group halo mass, or host-halo mass (in log10 units)
         """
         # Integrand is just the density of galaxies at mass m by m
-        integrand = self.m[self._gm] ** 2*self.dndm[self._gm]*self.n_tot[self._gm]
+        integrand = self._gm_m ** 2*self._gm_dndm*self._gm_n_tot
 
         m = intg.trapz(integrand, dx=np.log(self.m[1]/self.m[0]))
         return np.log10((m/self.mean_gal_den))
@@ -406,7 +565,7 @@ class HaloModel(MassFunction):
     @cached_quantity
     def satellite_fraction(self):
         # Integrand is just the density of satellite galaxies at mass m
-        integrand = self.m[self._gm]*self.dndm[self._gm]*self.n_sat[self._gm]
+        integrand = self._gm_m*self._gm_dndm*self._gm_n_sat
         s = intg.trapz(integrand, dx=np.log(self.m[1]/self.m[0]))
         return s/self.mean_gal_den
 
@@ -504,36 +663,115 @@ class HaloModel(MassFunction):
         if mmax2 is None:
             mmax2 = mmax
 
-        if mmin == mmax or mmin2 == mmax2:
-            spl = spline(np.log10(self.m), self.bias)
         if mmin == mmax:
-            b1 = spl(mmin)
+            b1 = self._get_bias_model(m=10 ** np.atleast_1d(mmin), **self.bias_params).bias()[..., 0]
         else:
-            mask = np.logical_and(self.m >= 10 ** mmin, self.m <= 10 ** mmax)
-            b1 = intg.simps(self.bias[mask]*self.dndm[mask], self.m[mask])/intg.simps(self.dndm[mask], self.m[mask])
+            b1 = self.bias_binned([mmin, mmax])[0]
 
         if mmin2 == mmax2:
-            b2 = spl(mmin2)
+            b2 = self._get_bias_model(m=10 ** np.atleast_1d(mmin2), **self.bias_params).bias()[..., 0]
         else:
-            mask = np.logical_and(self.m >= 10 ** mmin2, self.m <= 10 ** mmax2)
-            b2 = intg.simps(self.bias[mask]*self.dndm[mask], self.m[mask])/intg.simps(self.dndm[mask], self.m[mask])
+            b2 = self.bias_binned([mmin2, mmax2])[0]
 
         return b1*b2*self._power_halo_centres
 
+    @cached_quantity
+    def _cumulative_bias_dndm(self):
+        """
+        Cumulative integrals (from `m[0]`) of `bias*dndm` and `dndm` over mass, from
+        which the mean bias in any mass range is found without further integration.
+        """
+        lnm = np.log(self.m)
+        return (intg.cumtrapz(self.bias*self.dndm*self.m, lnm, initial=0),
+                intg.cumtrapz(self.dndm*self.m, lnm, initial=0))
+
+    def bias_binned(self, edges):
+        """
+        The mean bias of haloes in each of a set of mass bins, weighted by the mass function.
+
+        Parameters
+        ----------
+        edges : array_like
+            The (log10) mass bin edges, of length nbin+1. Bins are truncated to
+            the range of `m`, and must not be empty once truncated.
+
+        Returns
+        -------
+        bias : array_like, shape (nbin,)
+        """
+        cb, cn = self._cumulative_bias_dndm
+        lgm = np.log10(self.m)
+        edges = np.asarray(edges, dtype=float)
+
+        if np.any(np.diff(np.clip(edges, lgm[0], lgm[-1])) <= 0):
+            raise ValueError("Mass bins must be increasing, and overlap the mass grid (10^%s to 10^%s)"
+                             % (lgm[0], lgm[-1]))
+
+        return np.diff(np.interp(edges, lgm, cb))/np.diff(np.interp(edges, lgm, cn))
+
+    def power_hh_bins(self, edges, edges2=None):
+        """
+        The halo-centre cross power spectra of all pairs of a set of halo mass bins.
+
+        The power of each pair is linearly biased, with the mean bias of each bin
+        taken from :meth:`bias_binned`.
+
+        Parameters
+        ----------
+        edges : array_like
+            The (log10) mass bin edges, of length nbin+1.
+
+        edges2 : array_like, optional
+            The (log10) mass bin edges of the second halo of each pair, of length
+            nbin2+1. By default, the same as `edges`.
+
+        Returns
+        -------
+        power : array_like, shape (nbin, nbin2, nk)
+        """
+        b1 = self.bias_binned(edges)
+        b2 = b1 if edges2 is None else self.bias_binned(edges2)
+        return np.outer(b1, b2)[:, :, np.newaxis]*self._power_halo_centres
+
+    @cached_quantity
+    def _corr_halo_centres(self):
+        """
+        The correlation function of :attr:`_power_halo_centres`.
+        """
+        return tools.power_to_corr_ogata(self._power_halo_centres, self.k, self.r)
+
+    def corr_hh_bins(self, edges, edges2=None):
+        """
+        The halo-centre cross correlation functions of all pairs of a set of halo mass bins.
+
+        Since the Hankel transform is linear, and the spectra of all pairs differ only
+        by their bias, this requires just one transform (of :attr:`_power_halo_centres`).
+        See :meth:`power_hh_bins` for the parameters.
+
+        Returns
+        -------
+        corr : array_like, shape (nbin, nbin2, nr)
+        """
+        b1 = self.bias_binned(edges)
+        b2 = b1 if edges2 is None else self.bias_binned(edges2)
+        return np.outer(b1, b2)[:, :, np.newaxis]*self._corr_halo_centres
+
     # ===========================================================================
     # Halo Profile cached quantities
     # ===========================================================================
+    # The concentrations are passed explicitly, so that the c(m) relation is
+    # evaluated only once (in `concentration`) for all profile quantities.
     @cached_quantity
     def profile_ukm(self):
-        return self.profile.u(self.k, self.m)
+        return self.profile.u(self.k, self.m, c=self.concentration)
 
     @cached_quantity
     def profile_rho(self):
-        return self.profile.rho(self.r, self.m, norm="m")
+        return self.profile.rho(self.r, self.m, norm="m", c=self.concentration)
 
     @cached_quantity
     def profile_lam(self):
-        return self.profile.lam(self.r, self.m)
+        return self.profile.lam(self.r, self.m, c=self.concentration)
 
     # ===========================================================================
     # 2-point DM statistics
@@ -643,18 +881,18 @@ class HaloModel(MassFunction):
         """
         if USEFORT:
             ## The fortran routine is very very slightly faster. Should remove it.
-            u = self.profile_ukm
+            u = self._gm_ukm
             p = fort.power_gal_1h_ss(nlnk=len(self.k),
-                                     nm=len(self.m[self._gm]),
+                                     nm=len(self._gm_m),
                                      u=np.asfortranarray(u),
-                                     dndm=self.dndm[self._gm],
-                                     nsat=self.n_sat[self._gm],
-                                     ncen=self.n_cen[self._gm],
-                                     mass=self.m[self._gm],
+                                     dndm=self._gm_dndm,
+                                     nsat=self._gm_n_sat,
+                                     ncen=self._gm_n_cen,
+                                     mass=self._gm_m,
                                      central=self.hod._central)
         else:
-            u = self.profile_ukm[:, self._gm]
-            integ = u ** 2*self.dndm[self._gm]*self.m[self._gm]*self.hod.ss_pairs(self.m[self._gm])
+            u = self._gm_ukm
+            integ = u ** 2*self._gm_dndm*self._gm_m*self._gm_ss_pairs
 
             ### The following may not need to be done?
             # TODO: investigate what on earth to do here.
@@ -664,7 +902,7 @@ class HaloModel(MassFunction):
             if self.force_1halo_turnover:
                 r = np.pi/self.k/10  # The 10 is a complete heuristic hack.
                 mmin = 4*np.pi*r ** 3*self.mean_density0*self.delta_halo/3
-                mask = np.outer(self.m[self._gm], np.ones_like(self.k)) < mmin
+                mask = np.outer(self._gm_m, np.ones_like(self.k)) < mmin
                 integ[mask.T] = 0
 
             p = intg.trapz(integ, dx=self.dlog10m*np.log(10))
@@ -674,8 +912,8 @@ class HaloModel(MassFunction):
     @cached_quantity
     def corr_gg_1h_ss(self):
         if self.profile.has_lam:
-            lam = self.profile.lam(self.r, self.m[self._gm], norm="m")
-            integ = self.m[self._gm]*self.dndm[self._gm]*self.hod.ss_pairs(self.m[self._gm])*lam
+            lam = self._gm_lam
+            integ = self._gm_m*self._gm_dndm*self._gm_ss_pairs*lam
 
             c = intg.trapz(integ, dx=self.dlog10m*np.log(10))
 
@@ -687,8 +925,8 @@ class HaloModel(MassFunction):
     @cached_quantity
     def power_gg_1h_cs(self):
         """The cen-sat part of the 1-halo galaxy-galaxy power"""
-        u = self.profile_ukm[:, self._gm]
-        integ = self.dndm[self._gm]*2*self.hod.cs_pairs(self.m[self._gm])*u*self.m[self._gm]
+        u = self._gm_ukm
+        integ = self._gm_dndm*2*self._gm_cs_pairs*u*self._gm_m
 
         ### The following may not need to be done?
         # TODO: investigate what on earth to do here.
@@ -698,7 +936,7 @@ class HaloModel(MassFunction):
         if self.force_1halo_turnover:
             r = np.pi/self.k/10  # The 10 is a complete heuristic hack.
             mmin = 4*np.pi*r ** 3*self.mean_density0*self.delta_halo/3
-            mask = np.outer(self.m[self._gm], np.ones_like(self.k)) < mmin
+            mask = np.outer(self._gm_m, np.ones_like(self.k)) < mmin
             integ[mask.T] = 0
 
         c = intg.trapz(integ, dx=self.dlog10m*np.log(10))
@@ -721,20 +959,20 @@ class HaloModel(MassFunction):
     @cached_quantity
     def corr_gg_1h_cs(self):
         """The cen-sat part of the 1-halo galaxy correlations"""
-        rho = self.profile_rho[:, self._gm]
+        rho = self._gm_rho
         if USEFORT:
             c = fort.corr_gal_1h_cs(nr=len(self.r),
-                                    nm=len(self.m[self._gm]),
+                                    nm=len(self._gm_m),
                                     r=self.r,
-                                    mass=self.m[self._gm],
-                                    dndm=self.dndm[self._gm],
-                                    ncen=self.n_cen[self._gm],
-                                    nsat=self.n_sat[self._gm],
+                                    mass=self._gm_m,
+                                    dndm=self._gm_dndm,
+                                    ncen=self._gm_n_cen,
+                                    nsat=self._gm_n_sat,
                                     rho=np.asfortranarray(rho),
                                     mean_dens=self.mean_density0,
                                     delta_halo=self.delta_halo)
         else:
-            integ = self.dndm[self._gm]*2*self.hod.cs_pairs(self.m)[self._gm]*rho*self.m[self._gm]
+            integ = self._gm_dndm*2*self._gm_cs_pairs*rho*self._gm_m
             c = intg.trapz(integ, dx=self.dlog10m*np.log(10))
 
         return c/self.mean_gal_den ** 2 - 1
@@ -743,27 +981,26 @@ class HaloModel(MassFunction):
     def corr_gg_1h(self):
         """The 1-halo term of the galaxy correlations"""
         if self.profile.has_lam:
-            rho = self.profile_rho[:, self._gm]
-            lam = self.profile_lam[:, self._gm]
+            rho = self._gm_rho
+            lam = self._gm_lam
             if USEFORT:
                 ## Using fortran only saves about 15% of time on this single routine (eg. 7ms --> 8.7ms)
                 c = fort.corr_gal_1h(nr=len(self.r),
-                                     nm=len(self.m[self._gm]),
+                                     nm=len(self._gm_m),
                                      r=self.r,
-                                     mass=self.m[self._gm],
-                                     dndm=self.dndm[self._gm],
-                                     ncen=self.n_cen[self._gm],
-                                     nsat=self.n_sat[self._gm],
+                                     mass=self._gm_m,
+                                     dndm=self._gm_dndm,
+                                     ncen=self._gm_n_cen,
+                                     nsat=self._gm_n_sat,
                                      rho=np.asfortranarray(rho),
                                      lam=np.asfortranarray(lam),
                                      central=self.hod._central,
                                      mean_dens=self.mean_density0,
                                      delta_halo=self.delta_halo)
             else:
-                integ = self.m[self._gm]*self.dndm[self._gm]*(self.hod.ss_pairs(self.m[self._gm])*lam +
-                                                              2*self.hod.cs_pairs(self.m[self._gm])*rho)
+                integ = self._gm_m*self._gm_dndm*(self._gm_ss_pairs*lam + 2*self._gm_cs_pairs*rho)
                 if self.hod._central:
-                    integ *= self.n_cen[self._gm]
+                    integ *= self._gm_n_cen
 
                 c = intg.trapz(integ, dx=self.dlog10m*np.log(10))
 
@@ -774,13 +1011,13 @@ class HaloModel(MassFunction):
 
     @cached_quantity
     def power_gg_2h(self):
-        u = self.profile_ukm[:, self._gm]
+        u = self._gm_ukm
         if self.sd_bias_model is not None:
-            bias = np.outer(self.sd_bias.bias_scale(), self.bias)[:, self._gm]
+            bias = np.outer(self.sd_bias.bias_scale(), self._gm_bias)
         else:
-            bias = self.bias[self._gm]
-        inst = self.exclusion_model(m=self.m[self._gm], density=self.n_tot[self._gm]*self.dndm[self._gm],
-                                    I=self.n_tot[self._gm]*self.dndm[self._gm]*u/self.mean_gal_den,
+            bias = self._gm_bias
+        inst = self.exclusion_model(m=self._gm_m, density=self._gm_n_tot*self._gm_dndm,
+                                    I=self._gm_n_tot*self._gm_dndm*u/self.mean_gal_den,
                                     bias=bias, r=self.r, delta_halo=self.delta_halo,
                                     mean_density=self.mean_density0,
                                     **self.exclusion_params)
@@ -792,6 +1029,44 @@ class HaloModel(MassFunction):
 
         return inst.integrate()*self._power_halo_centres
 
+    def power_gg_2h_batch(self, **bias_params):
+        """
+        The 2-halo term of the galaxy power for many sets of bias model parameters at once.
+
+        Parameters
+        ----------
+        bias_params :
+            Parameters of the bias model, any of which may be arrays (of the same
+            length, nparam). Unspecified parameters are taken from :attr:`bias_params`.
+
+        Returns
+        -------
+        power : array_like, shape (nparam, nk), or (nparam, nr, nk) for exclusion models which
+            depend on scale.
+        """
+        bias = self.bias_batch(**bias_params)[:, self._gm]
+        density = self._gm_n_tot*self._gm_dndm
+        I = density*self._gm_ukm/self.mean_gal_den
+        dlnm = np.log(self.m[1]/self.m[0])
+
+        if self.exclusion_model is NoExclusion and self.sd_bias_model is None:
+            # Simpson's rule is linear, so its weights allow every set of parameters
+            # to be integrated in a single product.
+            w = tools.simps_weights(len(self._gm_m), dlnm)
+            p = np.einsum("km,pm->pk", I*self._gm_m*w, bias) ** 2
+        else:
+            p = []
+            for b in bias:
+                if self.sd_bias_model is not None:
+                    b = np.outer(self.sd_bias.bias_scale(), b)
+                inst = self.exclusion_model(m=self._gm_m, density=density, I=I, bias=b, r=self.r,
+                                            delta_halo=self.delta_halo, mean_density=self.mean_density0,
+                                            **self.exclusion_params)
+                p.append(inst.integrate())
+            p = np.array(p)
+
+        return p*self._power_halo_centres
+
     @cached_quantity
     def corr_gg_2h(self):
         """The 2-halo term of the galaxy correlation"""
@@ -826,6 +1101,184 @@ class HaloModel(MassFunction):
         """The galaxy correlation function"""
         return self.corr_gg_1h + self.corr_gg_2h + 1
 
+    # ===========================================================================
+    # Cross-sample galaxy statistics
+    # ===========================================================================
+    # Statistics of each pair of the samples `hods`. All samples share everything
+    # that does not depend on the HOD (the mass function, bias, profiles, and the
+    # exclusion geometry), and are integrated over one mass range, covering them all.
+    # The self-pairs therefore agree with the single-sample statistics to within
+    # the accuracy of the mass integrals.
+    @cached_quantity
+    def hods(self):
+        "The HOD of each sample: `hod`, followed by each of `hod_samples`"
+        hods = [self.hod]
+        for h in self.hod_samples or []:
+            if isinstance(h, hod.HOD):
+                hods.append(h)
+            elif issubclass_(self.hod_model, hod.HOD):
+                hods.append(self.hod_model(**h))
+            else:
+                hods.append(get_model(self.hod_model, "halomod.hod", **h))
+        return hods
+
+    @cached_quantity
+    def _gm_samples(self):
+        "A galaxy mask (see `_gm`) covering every sample"
+        mmins = [h.mmin for h in self.hods]
+        return self._mass_slice(None if None in mmins else min(mmins))
+
+    @cached_quantity
+    def _samples_n(self):
+        "Central and satellite occupations of each sample, (2, nsample, nm) within `_gm_samples`"
+        m = self.m[self._gm_samples]
+        return np.array([[h.nc(m) for h in self.hods], [h.ns(m) for h in self.hods]])
+
+    @cached_quantity
+    def _samples_pairs(self):
+        """
+        Mean numbers of central-satellite and satellite-satellite pairs of each pair
+        of samples, in a halo of mass m, each (nsample, nsample, nm).
+
+        Galaxies of different samples are independent, and the self-pairs are
+        those given by each HOD.
+        """
+        m = self.m[self._gm_samples]
+        nc, ns = self._samples_n
+        cs = (np.einsum("am,bm->abm", nc, ns) + np.einsum("am,bm->abm", ns, nc))/2
+        ss = np.einsum("am,bm->abm", ns, ns)
+        for i, h in enumerate(self.hods):
+            cs[i, i] = h.cs_pairs(m)
+            ss[i, i] = h.ss_pairs(m)
+        return cs, ss
+
+    @cached_quantity
+    def _samples_weights(self):
+        "Trapezoidal weights of the (ln m) integrals of the cross-sample statistics, times m*dndm"
+        gm = self._gm_samples
+        w = self.m[gm]*self.dndm[gm]*self.dlog10m*np.log(10)
+        w[[0, -1]] /= 2
+        return w
+
+    @cached_quantity
+    def mean_gal_den_samples(self):
+        "The mean number density of galaxies of each sample"
+        return np.dot(self._samples_n.sum(0), self._samples_weights)
+
+    @cached_quantity
+    def _power_gg_1h_cross_parts(self):
+        "The cen-sat and sat-sat parts of the 1-halo cross power, each (nsample, nsample, nk)"
+        u = self.profile_ukm[:, self._gm_samples]
+        if self.force_1halo_turnover:
+            r = np.pi/self.k/10  # The 10 is a complete heuristic hack.
+            mmin = 4*np.pi*r ** 3*self.mean_density0*self.delta_halo/3
+            u = np.where(np.less_equal.outer(mmin, self.m[self._gm_samples]), u, 0)
+
+        cs, ss = self._samples_pairs
+        w = self._samples_weights
+        ng2 = np.outer(self.mean_gal_den_samples, self.mean_gal_den_samples)[:, :, np.newaxis]
+        return (np.einsum("abm,km->abk", 2*cs*w, u)/ng2,
+                np.einsum("abm,km->abk", ss*w, u ** 2)/ng2)
+
+    @cached_quantity
+    def power_gg_1h_cross(self):
+        "The 1-halo galaxy cross power of each pair of samples, (nsample, nsample, nk)"
+        cs, ss = self._power_gg_1h_cross_parts
+        return cs + ss
+
+    @cached_quantity
+    def _samples_exclusion(self):
+        "An instance of the exclusion model for each sample"
+        gm = self._gm_samples
+        dndm = self.dndm[gm]
+        u = self.profile_ukm[:, gm]
+        if self.sd_bias_model is not None:
+            bias = np.outer(self.sd_bias.bias_scale(), self.bias[gm])
+        else:
+            bias = self.bias[gm]
+
+        return [self.exclusion_model(m=self.m[gm], density=ntot*dndm, I=ntot*dndm*u/ng,
+                                     bias=bias, r=self.r, delta_halo=self.delta_halo,
+                                     mean_density=self.mean_density0, **self.exclusion_params)
+                for ntot, ng in zip(self._samples_n.sum(0), self.mean_gal_den_samples)]
+
+    @cached_quantity
+    def power_gg_2h_cross(self):
+        """
+        The 2-halo galaxy cross power of each pair of samples, (nsample, nsample, nk),
+        or (nsample, nsample, nr, nk) for exclusion models which depend on scale.
+        """
+        inst = self._samples_exclusion
+        n = len(inst)
+        p = [[None]*n for _ in range(n)]
+        for a in range(n):
+            for b in range(a, n):
+                p[a][b] = p[b][a] = inst[a].integrate() if a == b else inst[a].integrate_cross(inst[b])
+        return np.array(p)*self._power_halo_centres
+
+    @cached_quantity
+    def power_gg_cross(self):
+        "The galaxy cross power of each pair of samples (see :meth:`power_gg_2h_cross` for its shape)"
+        p2h = self.power_gg_2h_cross
+        if p2h.ndim == 4:
+            return self.power_gg_1h_cross[:, :, np.newaxis] + p2h
+        return self.power_gg_1h_cross + p2h
+
+    @cached_quantity
+    def corr_gg_1h_cross(self):
+        "The 1-halo galaxy cross correlation of each pair of samples, (nsample, nsample, nr)"
+        gm = self._gm_samples
+        cs, ss = self._samples_pairs
+        w = self._samples_weights
+        ng2 = np.outer(self.mean_gal_den_samples, self.mean_gal_den_samples)[:, :, np.newaxis]
+
+        # As in corr_gg_1h, which is the sum of corr_gg_1h_cs and corr_gg_1h_ss (+1) without lam.
+        if not self.profile.has_lam:
+            corr = np.einsum("abm,rm->abr", 2*cs*w, self.profile_rho[:, gm])/ng2
+            return corr + self._transform_pairs(self._power_gg_1h_cross_parts[1])
+
+        # With lam, corr_gg_1h weights the pairs of a central-condition sample by its
+        # central occupation, and so do the self-pairs here.
+        cs_w, ss_w = 2*cs*w, ss*w
+        nc = self._samples_n[0]
+        for i, h in enumerate(self.hods):
+            if h._central:
+                cs_w[i, i] *= nc[i]
+                ss_w[i, i] *= nc[i]
+
+        return (np.einsum("abm,rm->abr", cs_w, self.profile_rho[:, gm]) +
+                np.einsum("abm,rm->abr", ss_w, self.profile_lam[:, gm]))/ng2 - 1
+
+    @cached_quantity
+    def corr_gg_2h_cross(self):
+        "The 2-halo galaxy cross correlation of each pair of samples, (nsample, nsample, nr)"
+        corr = self._transform_pairs(self.power_gg_2h_cross)
+
+        # modify by the new density of each sample, as in corr_gg_2h.
+        dens = []
+        for inst, ng in zip(self._samples_exclusion, self.mean_gal_den_samples):
+            d = np.array(inst.density_mod) if hasattr(inst, "density_mod") else np.ones_like(self.r)*ng
+            if self.r[-1] > 2*self.profile._mvir_to_rvir(self.m[-1]):
+                d *= ng/d[-1]
+            dens.append(d/ng)
+        dens = np.array(dens)
+        return np.einsum("ar,br->abr", dens, dens)*(1 + corr) - 1
+
+    @cached_quantity
+    def corr_gg_cross(self):
+        "The galaxy cross correlation of each pair of samples, (nsample, nsample, nr)"
+        return self.corr_gg_1h_cross + self.corr_gg_2h_cross + 1
+
+    def _transform_pairs(self, power):
+        "Correlation functions of a symmetric (nsample, nsample, [nr,] nk) array of power spectra"
+        transform = tools.power_to_corr_ogata if power.ndim == 3 else tools.power_to_corr_ogata_matrix
+        n = len(power)
+        out = np.empty((n, n, len(self.r)))
+        for a in range(n):
+            for b in range(a, n):
+                out[a, b] = out[b, a] = transform(power[a, b], self.k, self.r)
+        return out
+
     # ===========================================================================
     # Other utilities
     # ===========================================================================
@@ -839,7 +1292,7 @@ class HaloModel(MassFunction):
         c = deepcopy(self)
         c.update(hod_params={"M_min": self.Mmin}, dlog10m=0.01)
 
-        integrand = c.m[c._gm]*c.dndm[c._gm]*c.n_tot[c._gm]
+        integrand = c._gm_m*c._gm_dndm*c._gm_n_tot
 
         if self.hod.sharp_cut:
             integral = intg.cumtrapz(integrand[::-1], dx=np.log(c.m[1]/c.m[0]))
@@ -851,7 +1304,7 @@ class HaloModel(MassFunction):
 
             ind = np.where(integral > ng)[0][0]
 
-            m = c.m[c._gm][::-1][1:][max(ind - 4, 0):min(ind + 4, len(c.m))]
+            m = c._gm_m[::-1][1:][max(ind - 4, 0):min(ind + 4, len(c.m))]
             integral = integral[max(ind - 4, 0):min(ind + 4, len(c.m))]
 
             spline_int = spline(np.log(integral), np.log(m), k=3)
@@ -865,8 +1318,10 @@ class HaloModel(MassFunction):
                                   "or checking ng."%(ng, integral))
 
             def model(mmin):
+                if mmin < np.log10(c.m[0]):
+                    return np.inf
                 c.update(hod_params={"M_min": mmin})
-                integrand = c.m[c._gm]*c.dndm[c._gm]*c.n_tot[c._gm]
+                integrand = c._gm_m*c._gm_dndm*c._gm_n_tot
                 integral = intg.simps(integrand, dx=np.log(c.m[1]/c.m[0]))
                 return abs(integral - ng)
 
@@ -11,12 +11,58 @@ from scipy.interpolate import InterpolatedUnivariateSpline as _spline
 from scipy.integrate import simps
 from halo_model import HaloModel
 from hmf._cache import cached_quantity, parameter
-from halo_exclusion import dblsimps
+from halo_exclusion import NoExclusion
+import tools
 from hmf.cosmo import Cosmology as csm
 import warnings
+from copy import deepcopy
+try:
+    from pathos import multiprocessing as mp
+    HAVE_POOL = True
+except ImportError:
+    HAVE_POOL = False
 
 class ProjectedCF(HaloModel):
-    def __init__(self, rp_min=0.01, rp_max=50.0, rp_num=30, rp_log=True, proj_limit=None, **kwargs):
+    """
+    Framework extension to projected correlation functions.
+
+    Parameters
+    ----------
+    rp_min, rp_max : float, optional
+        min,max projected separations [Mpc/h]. `rp_min` may instead be an array
+        of projected separations.
+
+    rp_num : int, optional
+        Number of projected separations.
+
+    rp_log : bool, optional
+        Whether to use logspace for rp values.
+
+    proj_limit : float, optional
+        The maximum 3D separation [Mpc/h] contributing to the projection. By
+        default, this is large enough to converge on the infinite projection.
+
+    r_tol : float, optional
+        If given, the grid of 3D separations, `r`, is built adaptively (see
+        :func:`adaptive_r_grid`), such that both the interpolation of the
+        correlation function, and the resulting projection, converge to this
+        relative tolerance. Otherwise, `r` has `rnum` log-spaced points (by
+        default, 5*rp_num). The number of points used is `len(r)`.
+
+    proj_method : str, {"real", "hankel"}, optional
+        How to calculate `projected_corr_gal`. "real" integrates `corr_gg` along
+        the line of sight. "hankel" transforms `power_gg` directly (see
+        :func:`tools.power_to_wp_fftlog`), which avoids calculating the real-space
+        correlation at all, except for a correction at large separations if
+        `proj_limit` is given. It is only possible when `power_gg` does not depend
+        on scale (i.e. with no halo exclusion or scale-dependent bias); otherwise
+        "real" is used.
+
+    kwargs : unpacked-dict
+        Any keyword arguments passed down to :class:`halomod.HaloModel`.
+    """
+    def __init__(self, rp_min=0.01, rp_max=50.0, rp_num=30, rp_log=True, proj_limit=None,
+                 proj_method="real", r_tol=None, **kwargs):
         # Set default rnum
         if "rnum" not in kwargs:
             kwargs['rnum'] = 5*rp_num
@@ -24,6 +70,8 @@ class ProjectedCF(HaloModel):
         super(ProjectedCF, self).__init__(**kwargs)
 
         self.proj_limit = proj_limit
+        self.proj_method = proj_method
+        self.r_tol = r_tol
         self.rp_min = rp_min
         self.rp_max = rp_max
         self.rp_num = rp_num
@@ -51,6 +99,18 @@ class ProjectedCF(HaloModel):
     def proj_limit(self, val):
         return val
 
+    @parameter("res")
+    def r_tol(self, val):
+        if val is not None and val <= 0:
+            raise ValueError("r_tol must be > 0")
+        return val
+
+    @parameter("switch")
+    def proj_method(self, val):
+        if val not in ["real", "hankel"]:
+            raise ValueError("proj_method must be 'real' or 'hankel'")
+        return val
+
 
     @cached_quantity
     def rp(self):
@@ -74,7 +134,26 @@ class ProjectedCF(HaloModel):
 
     @cached_quantity
     def r(self):
-        return np.logspace(np.log10(self.rp.min()), np.log10(self.rlim), self.rnum)
+        if self.r_tol is None:
+            return np.logspace(np.log10(self.rp.min()), np.log10(self.rlim), self.rnum)
+
+        def xi(r):
+            return tools.power_to_corr_ogata(self._power_gg_smooth, self.k, r)
+
+        return adaptive_r_grid(xi, self.rp, self.rlim, self.r_tol, rnum_init=max(self.rp_num, 10))
+
+    @cached_quantity
+    def _power_gg_smooth(self):
+        """
+        The galaxy power without halo exclusion or scale-dependent bias (which
+        both depend on `r`), used to place the adaptive grid of `r`. This must
+        not use `r` itself, so it never uses `power_gg`, even without exclusion.
+        """
+        inst = NoExclusion(m=self._gm_m, density=self._gm_n_tot*self._gm_dndm,
+                           I=self._gm_n_tot*self._gm_dndm*self._gm_ukm/self.mean_gal_den,
+                           bias=self._gm_bias, r=None, delta_halo=self.delta_halo,
+                           mean_density=self.mean_density0)
+        return self.power_gg_1h + inst.integrate()*self._power_halo_centres
 
     @cached_quantity
     def projected_corr_gal(self):
@@ -84,9 +163,63 @@ class ProjectedCF(HaloModel):
         From Beutler 2011, eq 6.
 
         To integrate perform a substitution y = x - r_p.
+
+        If `proj_method` is "hankel", this is instead the J0 Hankel transform of
+        `power_gg`, less the contribution of separations beyond `proj_limit`
+        (if given).
         """
+        if self._use_hankel:
+            return self._project_power(self.power_gg)
+
         return projected_corr_gal(self.r, self.corr_gg, self.rlim, self.rp)
 
+    @cached_quantity
+    def projected_corr_gal_cross(self):
+        """
+        Projected cross-correlation functions of each pair of galaxy samples (see
+        :attr:`hods`), shape (nsample, nsample, nrp), calculated as for
+        `projected_corr_gal`.
+        """
+        n = len(self.hods)
+        if self._use_hankel:
+            power = self.power_gg_cross
+        else:
+            corr = self.corr_gg_cross
+
+        out = np.empty((n, n, len(self.rp)))
+        for a in range(n):
+            for b in range(a, n):
+                if self._use_hankel:
+                    out[a, b] = self._project_power(power[a, b])
+                else:
+                    out[a, b] = projected_corr_gal(self.r, corr[a, b], self.rlim, self.rp)
+                out[b, a] = out[a, b]
+        return out
+
+    @cached_quantity
+    def _use_hankel(self):
+        "Whether projections can be done in k-space"
+        if self.proj_method == "real":
+            return False
+        if self.exclusion_model is NoExclusion and self.sd_bias_model is None:
+            return True
+        warnings.warn("The power depends on scale, so projected correlations are integrated in real space")
+        return False
+
+    def _project_power(self, power):
+        """
+        The J0 Hankel transform of `power`, less the contribution of 3D separations
+        beyond `rlim` (if `proj_limit` is given), integrated over two decades of separation.
+        """
+        wp = tools.power_to_wp_fftlog(power, self.k, self.rp)
+        if self.proj_limit is None:
+            return wp
+
+        r = np.logspace(np.log10(self.rlim), np.log10(self.rlim) + 2, 200)
+        xi = tools.power_to_corr_ogata(power, self.k, r)
+        integrand = xi*r ** 2/np.sqrt(np.subtract.outer(r ** 2, self.rp ** 2)).T
+        return wp - 2*simps(integrand, dx=np.log(r[1]/r[0]))
+
 def projected_corr_gal(r, xir, rlim, rp_out=None):
     """
     Projected correlation function w(r_p).
@@ -105,37 +238,102 @@ def projected_corr_gal(r, xir, rlim, rp_out=None):
     """
     if rp_out is None:
         rp_out = r
+    rp_out = np.asarray(rp_out, dtype=float)
 
     lnr = np.log(r)
     lnxi = np.log(xir)
 
-    p = np.zeros_like(rp_out)
     fit = _spline(r, xir, k=3)  # [self.corr_gal > 0] maybe?
     f_peak = 0.01
-    a = 0
 
-    for i, rp in enumerate(rp_out):
-        if a != 1.3 and i < len(r) - 1:
-            # Get log slope at rp
-            ydiff = (lnxi[i + 1] - lnxi[i]) / (lnr[i + 1] - lnr[i])
-            # if the slope is flatter than 1.3, it will converge faster, but to make sure, we cut at 1.3
-            a = max(1.3, -ydiff)
-            theta = _get_theta(a)
+    # Get the log slope at each rp (using the corresponding entry of r, and the
+    # last available slope beyond it). If the slope is flatter than 1.3, it will
+    # converge faster, but to make sure, we cut at 1.3 (and keep that cut for all
+    # further rp).
+    with np.errstate(invalid="ignore"):
+        slope = -np.diff(lnxi)/np.diff(lnr)
+        a = np.where(slope > 1.3, slope, 1.3)[:len(rp_out)]
+    if np.any(a == 1.3):
+        a[np.argmax(a == 1.3):] = 1.3
+    a = np.concatenate((a, np.repeat(a[-1], len(rp_out) - len(a))))
+    theta = _get_theta(a)
+
+    # Set the (nrp, ny) grid of y, from the minimum to the upper limit of each rp.
+    lnymin = np.log(theta*f_peak ** 2*rp_out)
+    lnymax = np.log(rlim - rp_out)
+    y = np.exp(lnymin[:, np.newaxis] +
+               np.outer(lnymax - lnymin, np.linspace(0, 1, 1000)))
+
+    # Integrate
+    x = y + rp_out[:, np.newaxis]
+    integ_corr = fit(x.flatten()).reshape(x.shape)
+    integrand = x*integ_corr/np.sqrt((y + 2*rp_out[:, np.newaxis])*y)
+    return simps(integrand, y, axis=-1)*2
+
+def adaptive_r_grid(xi, rp, rlim, tol=1e-3, rnum_init=10, max_iter=10):
+    """
+    A grid of 3D separations, adapted to the shape of the correlation function,
+    on which to calculate :func:`projected_corr_gal`.
+
+    Starting from a coarse log-spaced grid, each interval is bisected (in log r)
+    if a spline through the current grid mis-estimates `xi` at its centre by more
+    than `tol`. This places points where the correlation function is curved
+    (eg. at the transition from the 1- to the 2-halo term) and few at large r.
+    Refinement stops once no interval is bisected and the projected correlation
+    has changed by less than `tol` since the previous iteration.
 
-        min_y = theta * f_peak ** 2 * rp
+    Parameters
+    ----------
+    xi : callable
+        A function of r [Mpc/h], returning the 3D correlation function. This need
+        only be a (cheap) approximation with the right shape.
 
-        # Get the upper limit for this rp
-        ylim = rlim - rp
+    rp : array_like
+        Projected separations at which the projection is required [Mpc/h].
 
-        # Set the y vector for this rp
-        y = np.logspace(np.log(min_y), np.log(ylim), 1000, base=np.e) 
+    rlim : float
+        The upper limit of the projection, and of the grid [Mpc/h].
 
-        # Integrate
-        integ_corr = fit(y + rp)
-        integrand = (y + rp) * integ_corr / np.sqrt((y + 2 * rp) * y)
-        p[i] = simps(integrand, y) * 2
+    tol : float, optional
+        Relative tolerance.
+
+    rnum_init : int, optional
+        Number of points in the initial grid.
+
+    max_iter : int, optional
+        Maximum number of refinements.
+
+    Returns
+    -------
+    r : array_like
+        The grid of separations.
+    """
+    lnr = np.linspace(np.log(np.min(rp)), np.log(rlim), rnum_init)
+    xir = xi(np.exp(lnr))
+    wp = projected_corr_gal(np.exp(lnr), xir, rlim, rp)
+
+    for i in range(max_iter):
+        lnr_mid = (lnr[1:] + lnr[:-1])/2
+        xi_mid = xi(np.exp(lnr_mid))
+        err = np.abs(_spline(np.exp(lnr), xir, k=3)(np.exp(lnr_mid)) - xi_mid)
+        refine = err > tol*np.abs(xi_mid)
+
+        if np.any(refine):
+            lnr = np.concatenate((lnr, lnr_mid[refine]))
+            xir = np.concatenate((xir, xi_mid[refine]))
+            indx = np.argsort(lnr)
+            lnr, xir = lnr[indx], xir[indx]
+
+        wp_new = projected_corr_gal(np.exp(lnr), xir, rlim, rp)
+        converged = np.all(np.abs(wp_new - wp) <= tol*np.abs(wp_new))
+        wp = wp_new
+        if converged and not np.any(refine):
+            break
+    else:
+        warnings.warn("The grid of r did not converge to a tolerance of %s in %s iterations" % (tol, max_iter))
+
+    return np.exp(lnr)
 
-    return p
 
 def _get_theta(a):
     theta = 2 ** (1 + 2 * a) * (7 - 2 * a ** 3 + 3 * np.sqrt(5 - 8 * a + 4 * a ** 2) + a ** 2 * (9 + np.sqrt(5 - 8 * a + 4 * a ** 2)) -
@@ -150,10 +348,61 @@ def flat_z_dist(zmin,zmax):
         return np.where(np.logical_and(z>=zmin,z<=zmax),1./(zmax-zmin),0)
     return ret
 
-def dxdz(z,cosmo=csm().cosmo):
+def dxdz(z,cosmo=None):
     "Derivative of comoving distance with redshift [Mpc/h]"
-    dh = cosmo.hubble_distance * cosmo.h
-    return dh.value/cosmo.efunc(z)
+    if cosmo is None:
+        cosmo = csm().cosmo
+    return DistanceTable.get(cosmo, np.max(z)).dxdz(z)
+
+
+class DistanceTable(object):
+    """
+    Comoving distance [Mpc/h], and its derivative with redshift, interpolated
+    from a table for a given cosmology.
+
+    The derivative, :math:`d_H/E(z)`, is tabulated and splined, and the distance
+    is the (exact) integral of the spline. Tables should be obtained with
+    :meth:`get`, which caches them for the most recently used cosmologies, so
+    that the (slow) astropy cosmology is only evaluated once for each.
+
+    Parameters
+    ----------
+    cosmo : `astropy.cosmology.FLRW` instance
+        The cosmology.
+
+    zmax : float
+        Maximum redshift of the table.
+
+    dz : float, optional
+        Spacing of the table in redshift.
+    """
+    _tables = tools.LRUCache(8)
+
+    def __init__(self, cosmo, zmax, dz=0.01):
+        self.zmax = zmax
+        z = np.linspace(0, zmax, int(np.ceil(zmax/dz)) + 1)
+        dh = (cosmo.hubble_distance*cosmo.h).value
+        self._dxdz = _spline(z, dh/cosmo.efunc(z))
+        self._x = self._dxdz.antiderivative()
+
+    @classmethod
+    def get(cls, cosmo, zmax=10.0):
+        """
+        The cached table for `cosmo`, covering at least redshifts up to `zmax`.
+        """
+        key = repr(cosmo)
+        if key not in cls._tables or cls._tables[key].zmax < zmax:
+            cls._tables[key] = cls(cosmo, max(zmax, 10.0))
+        return cls._tables[key]
+
+    def comoving_distance(self, z):
+        "Comoving distance at redshift z [Mpc/h]"
+        return self._x(z)
+
+    def dxdz(self, z):
+        "Derivative of comoving distance with redshift [Mpc/h]"
+        return self._dxdz(z)
+
 
 class AngularCF(HaloModel):
     """
@@ -201,6 +450,30 @@ class AngularCF(HaloModel):
     p_of_z : bool, optional
         Whether `p1` and `p2` are functions of redshift.
 
+    max_memory : int, optional
+        Approximate maximum memory [bytes] of the temporary arrays used in the
+        Limber integral.
+
+    limber_method : str, {"real", "hankel"}, optional
+        How to calculate `angular_corr_gal` and `angular_corr_matter`. "real"
+        integrates the 3D correlation function (see :func:`angular_corr_gal`),
+        which must be calculated out to large `r`. "hankel" uses the power
+        spectrum directly (see :func:`angular_corr_gal_hankel`). It is only
+        possible when the power does not depend on scale (i.e. with no halo
+        exclusion or scale-dependent bias); otherwise "real" is used.
+
+    p_samples : list of callables, optional
+        The redshift distribution of each galaxy sample (see :attr:`hods`), as for
+        `p1`, used by `angular_corr_gal_cross`. Default is `p1` for every sample.
+
+    z_nodes : int or array_like, optional
+        If given, the halo model is evaluated at several redshifts (this many,
+        evenly spaced in [zmin, zmax], or at these redshifts), rather than only at
+        `z`, and interpolated in redshift within the Limber integrals. The nodes
+        are calculated in parallel if ``pathos`` is installed. Each shares the
+        z=0 power spectrum (and transfer function) and mass variance of this
+        model, which are only rescaled by the growth factor at the node.
+
     kwargs : unpacked-dict
         Any keyword arguments passed down to :class:`halomod.HaloModel`.
     """
@@ -209,10 +482,10 @@ class AngularCF(HaloModel):
                  theta_min=1e-3 * np.pi/180.0, theta_max=np.pi/180.0, theta_num=30, theta_log=True,
                  zmin=0.2,zmax=0.4,znum=100,
                  logu_min=-4,logu_max=2.3,unum=100,check_p_norm=True, p_of_z=True,
-                 **kwargs):
+                 max_memory=2**28, limber_method="real", z_nodes=None, p_samples=None, **kwargs):
         super(AngularCF, self).__init__(**kwargs)
 
-        if self.z < zmin or self.z>zmax:
+        if z_nodes is None and (self.z < zmin or self.z>zmax):
             warnings.warn("Your specified redshift (z=%s) is not within your selection function, z=(%s,%s)"%(self.z,zmin,zmax))
 
         if p1 is None:
@@ -228,6 +501,10 @@ class AngularCF(HaloModel):
         self.unum = unum
         self.check_p_norm = check_p_norm
         self.p_of_z = p_of_z
+        self.max_memory = max_memory
+        self.limber_method = limber_method
+        self.z_nodes = z_nodes
+        self.p_samples = p_samples
 
         self.theta_min = theta_min
         self.theta_max = theta_max
@@ -243,6 +520,10 @@ class AngularCF(HaloModel):
     def p2(self, val):
         return val
 
+    @parameter("param")
+    def p_samples(self, val):
+        return val
+
     @parameter("model")
     def p_of_z(self,val):
         return val
@@ -295,6 +576,20 @@ class AngularCF(HaloModel):
     def check_p_norm(self, val):
         return val
 
+    @parameter("option")
+    def max_memory(self, val):
+        return val
+
+    @parameter("res")
+    def z_nodes(self, val):
+        return val
+
+    @parameter("switch")
+    def limber_method(self, val):
+        if val not in ["real", "hankel"]:
+            raise ValueError("limber_method must be 'real' or 'hankel'")
+        return val
+
     @cached_quantity
     def zvec(self):
         """
@@ -310,7 +605,7 @@ class AngularCF(HaloModel):
     @cached_quantity
     def xvec(self):
         "Radial distance grid (corresponds to zvec) [Mpc/h]"
-        return self.cosmo.comoving_distance(self.zvec).value
+        return DistanceTable.get(self.cosmo, self.zmax).comoving_distance(self.zvec)
 
     @cached_quantity
     def theta(self):
@@ -326,10 +621,111 @@ class AngularCF(HaloModel):
     @cached_quantity
     def r(self):
         "Physical separation grid [Mpc/h]"
-        rmin = np.sqrt((10 ** self.logu_min) ** 2 + self.theta.min() ** 2 * self.xvec.min() ** 2)
-        rmax = np.sqrt((10 ** self.logu_max) ** 2 + self.theta.max() ** 2 * self.xvec.max() ** 2)
+        # This depends only on the range of theta (not on `theta` itself), so that changing
+        # the number or spacing of angles re-uses the correlation functions.
+        rmin = np.sqrt((10 ** self.logu_min) ** 2 + self.theta_min ** 2 * self.xvec.min() ** 2)
+        rmax = np.sqrt((10 ** self.logu_max) ** 2 + self.theta_max ** 2 * self.xvec.max() ** 2)
         return np.logspace(np.log10(rmin), np.log10(rmax), self.rnum)
 
+    @cached_quantity
+    def _use_hankel(self):
+        "Whether the Limber integrals can be done in k-space"
+        if self.limber_method == "real":
+            return False
+        if self.exclusion_model is NoExclusion and self.sd_bias_model is None:
+            return True
+        warnings.warn("The power depends on scale, so angular correlations are integrated in real space")
+        return False
+
+    @cached_quantity
+    def z_node_grid(self):
+        "Redshifts at which the halo model is evaluated for the Limber integrals (None if only at `z`)"
+        if self.z_nodes is None:
+            return None
+        if np.iterable(self.z_nodes):
+            return np.array(self.z_nodes, dtype=float)
+        return np.linspace(self.zmin, self.zmax, self.z_nodes)
+
+    def _at_z_nodes(self, quantity):
+        """
+        The value of `quantity` for this model at each of `z_node_grid`.
+        """
+        # The z=0 power (and thus the transfer function) and mass variance are calculated
+        # here, before the model is copied, so that each node only rescales them by its
+        # growth factor rather than recomputing them.
+        self._power0, self._sigma_0
+
+        z = self.z_node_grid
+        if HAVE_POOL:
+            # Each worker receives one copy of the model, and evaluates its nodes in turn.
+            chunks = np.array_split(z, min(len(z), mp.cpu_count()))
+            res = sum(tools.get_pool().map(_quantity_at_z, [(self, quantity, zz) for zz in chunks]), [])
+        else:
+            res = _quantity_at_z((deepcopy(self), quantity, z))
+        return np.array(res)
+
+    @cached_quantity
+    def _power_gg_z(self):
+        return self._at_z_nodes("power_gg")
+
+    @cached_quantity
+    def _power_mm_z(self):
+        return self._at_z_nodes("power_mm")
+
+    @cached_quantity
+    def _power_gg_cross_z(self):
+        return self._at_z_nodes("power_gg_cross")
+
+    @cached_quantity
+    def _corr_gg_spline(self):
+        "Interpolant of corr_gg, as a function of r [Mpc/h] (one per redshift node, if `z_nodes` is given)"
+        if self.z_nodes is None:
+            return _spline(self.r, self.corr_gg)
+        return [_spline(self.r, xi) for xi in self._at_z_nodes("corr_gg")]
+
+    @cached_quantity
+    def _corr_mm_spline(self):
+        "Interpolant of corr_mm, as a function of r [Mpc/h] (one per redshift node, if `z_nodes` is given)"
+        if self.z_nodes is None:
+            return _spline(self.r, self.corr_mm)
+        return [_spline(self.r, xi) for xi in self._at_z_nodes("corr_mm")]
+
+    @cached_quantity
+    def _corr_gg_cross_spline(self):
+        "Interpolants of corr_gg_cross, indexed by sample pair (then by redshift node, if `z_nodes` is given)"
+        n = len(self.hods)
+        if self.z_nodes is None:
+            corr = self.corr_gg_cross
+            return [[_spline(self.r, corr[a, b]) for b in range(n)] for a in range(n)]
+
+        corr = self._at_z_nodes("corr_gg_cross")
+        return [[[_spline(self.r, xi) for xi in corr[:, a, b]] for b in range(n)] for a in range(n)]
+
+    def _angular_corr(self, name, pair=None, p1=None, p2=None):
+        """
+        The angular correlation function of the power spectrum or correlation
+        function given by `name`, either "gg", "mm" or "gg_cross" (for which `pair`
+        gives the indices of the samples). `p1` and `p2` default to those of the
+        instance.
+        """
+        p1 = p1 or self.p1
+        p2 = p2 or self.p2
+        kw = dict(znum=self.znum, p2=p2, check_p_norm=self.check_p_norm, cosmo=self.cosmo,
+                  p_of_z=self.p_of_z, x=self.xvec, z_nodes=self.z_node_grid)
+
+        if self._use_hankel:
+            power = getattr(self, ("power_%s" if self.z_nodes is None else "_power_%s_z") % name)
+            if pair is not None:
+                power = power[..., pair[0], pair[1], :]
+            return angular_corr_gal_hankel(self.theta, power, self.k, p1,
+                                           self.zmin, self.zmax, **kw)
+
+        xi = getattr(self, "_corr_%s_spline" % name)
+        if pair is not None:
+            xi = xi[pair[0]][pair[1]]
+        return angular_corr_gal(self.theta, xi, p1, self.zmin, self.zmax, self.logu_min, self.logu_max,
+                                unum=self.unum, max_memory=self.max_memory, **kw)
+
     @cached_quantity
     def angular_corr_gal(self):
         """
@@ -337,15 +733,7 @@ class AngularCF(HaloModel):
 
         From Blake+08, Eq. 33
         """
-        def xi(r):
-            s = _spline(self.r,self.corr_gg)
-            return s(r)
-
-        return angular_corr_gal(self.theta, xi, self.p1,
-                                self.zmin, self.zmax, self.logu_min, self.logu_max,
-                                znum=self.znum, unum=self.unum, p2=self.p2,
-                                check_p_norm=self.check_p_norm, cosmo=self.cosmo,
-                                p_of_z = self.p_of_z)
+        return self._angular_corr("gg")
 
     @cached_quantity
     def angular_corr_matter(self):
@@ -354,15 +742,124 @@ class AngularCF(HaloModel):
 
         From Blake+08, Eq. 33
         """
-        def xi(r):
-            s = _spline(self.r,self.corr_mm)
-            return s(r)
+        return self._angular_corr("mm")
+
+    @cached_quantity
+    def angular_corr_gal_cross(self):
+        """
+        The angular cross-correlation functions of each pair of galaxy samples (see
+        :attr:`hods`), with redshift distributions `p_samples`, shape
+        (nsample, nsample, ntheta).
+        """
+        n = len(self.hods)
+        p = self.p_samples or [self.p1]*n
 
-        return angular_corr_gal(self.theta, xi, self.p1,
-                                self.zmin, self.zmax, self.logu_min, self.logu_max,
-                                znum=self.znum, unum=self.unum, p2=self.p2,
-                                check_p_norm=self.check_p_norm, cosmo=self.cosmo,
-                                p_of_z = self.p_of_z)
+        out = np.empty((n, n, len(self.theta)))
+        for a in range(n):
+            for b in range(a, n):
+                out[a, b] = out[b, a] = self._angular_corr("gg_cross", (a, b), p[a], p[b])
+        return out
+
+
+class TomographicCF(AngularCF):
+    """
+    Framework extension to the angular power spectra of a set of tomographic
+    redshift bins.
+
+    The Limber angular power spectra of every pair of bins are calculated at once
+    (see :func:`angular_power_gal`). All other parameters, and the angular
+    correlation of `p1` and `p2`, are as in :class:`AngularCF`. By default,
+    `zmin` and `zmax` should cover all of the bins.
+
+    The Limber integral needs a power spectrum which does not depend on scale,
+    so the defaults here are ``exclusion_model="NoExclusion"`` and
+    ``sd_bias_model=None``, and other choices raise an error.
+
+    Parameters
+    ----------
+    p_bins : list of callables, optional
+        The redshift distribution of each bin, as for `p1` in :class:`AngularCF`.
+        Default is the single distribution `p1`.
+
+    ell_min, ell_max : float, optional
+        min,max multipoles.
+
+    ell_num : int, optional
+        Number of multipoles, in logspace.
+
+    kwargs : unpacked-dict
+        Any keyword arguments passed down to :class:`AngularCF`.
+    """
+
+    def __init__(self, p_bins=None, ell_min=10.0, ell_max=1e4, ell_num=50, **kwargs):
+        kwargs.setdefault("exclusion_model", "NoExclusion")
+        kwargs.setdefault("sd_bias_model", None)
+        super(TomographicCF, self).__init__(**kwargs)
+
+        self.p_bins = p_bins
+        self.ell_min = ell_min
+        self.ell_max = ell_max
+        self.ell_num = ell_num
+
+    @parameter("param")
+    def p_bins(self, val):
+        return val
+
+    @parameter("res")
+    def ell_min(self, val):
+        if val <= 0:
+            raise ValueError("ell_min must be > 0")
+        return val
+
+    @parameter("res")
+    def ell_max(self, val):
+        return val
+
+    @parameter("res")
+    def ell_num(self, val):
+        return val
+
+    @cached_quantity
+    def ell(self):
+        "Multipoles"
+        if self.ell_min > self.ell_max:
+            raise ValueError("ell_min must be less than ell_max")
+        return np.logspace(np.log10(self.ell_min), np.log10(self.ell_max), self.ell_num)
+
+    def _angular_power(self, name):
+        "The angular power spectra of all bin pairs, of the power given by `name`, either 'gg' or 'mm'"
+        if self.exclusion_model is not NoExclusion or self.sd_bias_model is not None:
+            raise ValueError("Angular power spectra require a power spectrum which does not depend on scale: "
+                             "use exclusion_model='NoExclusion' and sd_bias_model=None")
+        power = getattr(self, ("power_%s" if self.z_nodes is None else "_power_%s_z") % name)
+        return angular_power_gal(self.ell, power, self.k, self.p_bins or [self.p1],
+                                 self.zmin, self.zmax, znum=self.znum, check_p_norm=self.check_p_norm,
+                                 cosmo=self.cosmo, p_of_z=self.p_of_z, x=self.xvec,
+                                 z_nodes=self.z_node_grid)
+
+    @cached_quantity
+    def angular_power_gal(self):
+        """
+        The galaxy angular power spectra C_ell of each pair of bins, shape (nbin, nbin, nell).
+        """
+        return self._angular_power("gg")
+
+    @cached_quantity
+    def angular_power_matter(self):
+        """
+        The matter angular power spectra C_ell of each pair of bins, shape (nbin, nbin, nell).
+        """
+        return self._angular_power("mm")
+
+
+def _quantity_at_z(args):
+    "Update a model (a copy, or a pickled version in a subprocess) to each redshift z, and return a quantity"
+    model, quantity, z = args
+    res = []
+    for zz in z:
+        model.update(z=zz)
+        res.append(getattr(model, quantity))
+    return res
 
 def _check_p(p,z):
     if hasattr(p,"integral"):
@@ -377,7 +874,7 @@ def _check_p(p,z):
 
 def angular_corr_gal(theta, xi, p1, zmin, zmax, logu_min, logu_max,
                      znum=100, unum=100, p2=None, check_p_norm=True, cosmo=None,
-                     p_of_z=True,
+                     p_of_z=True, max_memory=2**28, x=None, z_nodes=None,
                      **xi_kw):
     """
     Calculate the angular correlation function w(theta).
@@ -426,6 +923,19 @@ def angular_corr_gal(theta, xi, p1, zmin, zmax, logu_min, logu_max,
         A cosmology, used to generate comoving distance from redshift. Default
         is the default cosmology of the `hmf` package.
 
+    max_memory : int, optional
+        Approximate maximum memory [bytes] of the temporary arrays. The integral
+        is performed for as many `theta` at a time as this allows.
+
+    x : array_like, optional
+        Pre-computed comoving distances [Mpc/h] at ``np.linspace(zmin, zmax, znum)``.
+        If not given, they are calculated from `cosmo`.
+
+    z_nodes : array_like, optional
+        If given, `xi` is a sequence of functions, giving the correlation function
+        at each of these redshifts. It is interpolated linearly in redshift
+        within the integral.
+
     xi_kw : unpacked-dict
         Any arguments to `xi` other than r,z.
 
@@ -434,36 +944,225 @@ def angular_corr_gal(theta, xi, p1, zmin, zmax, logu_min, logu_max,
     wtheta : array_like
         The angular correlation function corresponding to `theta`.
     """
-    if cosmo is None:
-        cosmo = csm().cosmo
-
     # Arrays
     u = np.logspace(logu_min, logu_max, unum)
     dlnu = np.log(u[1]/u[0])
 
-    if p_of_z:
-        z = np.linspace(zmin,zmax,znum)
-        diff = z[1] - z[0]
-        x = (cosmo.comoving_distance(z)*cosmo.h).value
+    x, z, p_integ, diff = _limber_weights(p1, zmin, zmax, znum, p2, check_p_norm, cosmo, p_of_z, x)
 
+    # Simpson's weights along each axis (as in dblsimps, which drops the last
+    # point of an even-length axis) are fused with p(x) and u.
+    nx = len(x) - (1 - len(x)%2)
+    nu = len(u) - (1 - len(u)%2)
+    x, u = x[:nx], u[:nu]
+    wx = p_integ[:nx]*_simps_weights(nx)
+    wu = u*_simps_weights(nu)
+
+    if z_nodes is None:
+        xi_R = lambda R: xi(R.flatten(), **xi_kw).reshape(R.shape)
     else:
-        xmin = (cosmo.comoving_distance(zmin)*cosmo.h).value
-        xmax = (cosmo.comoving_distance(zmax)*cosmo.h).value
-        x = np.linspace(xmin,xmax,znum)
-        diff = x[1] - x[0]
+        W = _z_interp_weights(z_nodes, z[:nx])
+
+        def xi_R(R):
+            out = np.zeros_like(R)
+            for f, w in zip(xi, W):
+                m = w > 0
+                if np.any(m):
+                    Rm = R[:, m]
+                    out[:, m] += w[m][:, np.newaxis]*f(Rm.flatten(), **xi_kw).reshape(Rm.shape)
+            return out
+
+    # Process theta in chunks, so that the (theta, x, u) grid is never held in full.
+    # Each element needs the separation and xi, and a few temporaries.
+    theta = np.atleast_1d(theta)
+    nchunk = max(1, int(max_memory//(32*nx*nu)))
+    out = np.empty(len(theta))
+    for i in range(0, len(theta), nchunk):
+        th = theta[i:i + nchunk]
+        R = np.sqrt(np.add.outer(np.outer(th**2, x**2), u**2))
+        out[i:i + nchunk] = np.einsum("kij,i,j->k", xi_R(R), wx, wu)
+
+    return 2*out*diff*dlnu/9.0
+
+
+def angular_corr_gal_hankel(theta, power, k, p1, zmin, zmax, znum=100, p2=None,
+                            check_p_norm=True, cosmo=None, p_of_z=True, x=None, z_nodes=None):
+    """
+    Calculate the angular correlation function w(theta) from the power spectrum.
 
-    if check_p_norm:
-        p1 = _check_p(p1,z if p_of_z else x)
+    This uses the Limber approximation, as :func:`angular_corr_gal`, but in
+    k-space: the line-of-sight integral of the correlation function at each
+    transverse separation is the J0 Hankel transform of the power,
+
+    .. math :: w(\\theta) = \\int dx\\, p_1(x) p_2(x) \\frac{1}{2\\pi}\\int_0^\\infty k P(k) J_0(k\\theta x) dk,
+
+    which is done for all (theta, x) pairs with a single FFTLog transform (see
+    :func:`tools.power_to_wp_fftlog`). No real-space correlation function is needed.
+
+    Parameters
+    ----------
+    theta : array_like
+        Angles at which to calculate the angular correlation. In radians.
+
+    power : array_like
+        The 3D power spectrum at `k`. If `z_nodes` is given, this has shape
+        (len(z_nodes), len(k)).
+
+    k : array_like
+        Log-spaced wavenumbers [h/Mpc], covering the support of the power.
+
+    Other Parameters
+    ----------------
+    p1, zmin, zmax, znum, p2, check_p_norm, cosmo, p_of_z, x, z_nodes :
+        See :func:`angular_corr_gal`.
+
+    Returns
+    -------
+    wtheta : array_like
+        The angular correlation function corresponding to `theta`.
+    """
+    x, z, p_integ, diff = _limber_weights(p1, zmin, zmax, znum, p2, check_p_norm, cosmo, p_of_z, x)
+
+    nx = len(x) - (1 - len(x)%2)
+    x = x[:nx]
+
+    # The projected correlation diverges at zero separation, so the node at x=0 (where
+    # the distributions must go to zero) is dropped, as in angular_power_gal.
+    pos = x > 0
+    wx = (p_integ[:nx]*_simps_weights(nx))[pos]
+    x = x[pos]
+
+    theta = np.atleast_1d(theta)
+    if z_nodes is None:
+        wp = tools.power_to_wp_fftlog(power, k, np.outer(theta, x).flatten()).reshape((len(theta), len(x)))
+    else:
+        wp = np.zeros((len(theta), len(x)))
+        for pk, w in zip(power, _z_interp_weights(z_nodes, z[:nx][pos])):
+            m = w > 0
+            if np.any(m):
+                rp = np.outer(theta, x[m])
+                wp[:, m] += w[m]*tools.power_to_wp_fftlog(pk, k, rp.flatten()).reshape(rp.shape)
+    return np.dot(wp, wx)*diff/3.0
 
-    if p2 is None:
-        p2 = p1
-    elif check_p_norm:
-        p2 = _check_p(p2,z if p_of_z else x)
 
+def angular_power_gal(ell, power, k, p_bins, zmin, zmax, znum=100, check_p_norm=True,
+                      cosmo=None, p_of_z=True, x=None, z_nodes=None):
+    """
+    Calculate the angular power spectra C_ell of every pair of a set of redshift bins.
+
+    This uses the Limber approximation,
+
+    .. math :: C^{ij}_\ell = \int dx\, \frac{p_i(x) p_j(x)}{x^2} P\left(\frac{\ell+1/2}{x}, z(x)\right).
+
+    The power is interpolated onto the (ell, x) grid once, and contracted with
+    all pairs of distributions in a single sum, so the cost hardly depends on
+    the number of bins.
+
+    Parameters
+    ----------
+    ell : array_like
+        Multipoles.
 
-    p_integ = p1(z)*p2(z) /dxdz(z,cosmo) if p_of_z else p1(x)*p2(x)
-    R = np.sqrt(np.add.outer(np.outer(theta**2 ,x**2),u**2)).flatten()
+    power : array_like
+        The 3D power spectrum at `k`. If `z_nodes` is given, this has shape
+        (len(z_nodes), len(k)).
+
+    k : array_like
+        Wavenumbers [h/Mpc]. The power is taken to be zero outside their range.
+
+    p_bins : list of callables
+        The distribution of each bin, either in redshift or comoving distance
+        (see `p_of_z`). Each is normalised as `p1` in :func:`angular_corr_gal`.
+
+    Other Parameters
+    ----------------
+    zmin, zmax, znum, check_p_norm, cosmo, p_of_z, x, z_nodes :
+        See :func:`angular_corr_gal`.
+
+    Returns
+    -------
+    cl : array_like
+        The angular power spectra, shape (len(p_bins), len(p_bins), len(ell)).
+    """
+    x, z, jac, diff = _limber_grid(zmin, zmax, znum, cosmo, p_of_z, x)
+    p = np.array([_eval_p(pb, x, z, check_p_norm, p_of_z) for pb in p_bins])
+
+    nx = len(x) - (1 - len(x)%2)
+    x, z, p = x[:nx], z[:nx], p[:, :nx]
+
+    # The integrand vanishes at x=0, where the distributions must go to zero.
+    wx = np.zeros(nx)
+    pos = x > 0
+    wx[pos] = (jac[:nx]*_simps_weights(nx))[pos]/x[pos]**2
+
+    lnk = np.log(k)
+    lnk_lx = np.log(np.outer(np.asarray(ell) + 0.5, 1/np.where(pos, x, 1.0)))
+    if z_nodes is None:
+        pk = np.interp(lnk_lx, lnk, power, left=0, right=0)
+    else:
+        pk = np.zeros(lnk_lx.shape)
+        for pn, w in zip(power, _z_interp_weights(z_nodes, z)):
+            m = w > 0
+            if np.any(m):
+                pk[:, m] += w[m]*np.interp(lnk_lx[:, m], lnk, pn, left=0, right=0)
+
+    return np.einsum("ix,jx,lx->ijl", p, p, pk*wx)*diff/3.0
+
+
+def _limber_weights(p1, zmin, zmax, znum, p2, check_p_norm, cosmo, p_of_z, x):
+    """
+    The grid of comoving distance [Mpc/h] for a Limber integral, the redshift
+    at each point, the product of the (normalised) distributions at each point,
+    and the grid spacing.
+    """
+    x, z, jac, diff = _limber_grid(zmin, zmax, znum, cosmo, p_of_z, x)
+
+    p1 = _eval_p(p1, x, z, check_p_norm, p_of_z)
+    p2 = p1 if p2 is None else _eval_p(p2, x, z, check_p_norm, p_of_z)
+    return x, z, p1*p2*jac, diff
+
+
+def _limber_grid(zmin, zmax, znum, cosmo, p_of_z, x):
+    """
+    The grid of comoving distance [Mpc/h] for a Limber integral, the redshift
+    at each point, dz/dx at each point if the integral is in redshift (or unity),
+    and the grid spacing.
+    """
+    if cosmo is None:
+        cosmo = csm().cosmo
+
+    z = np.linspace(zmin,zmax,znum)
+    table = DistanceTable.get(cosmo, zmax)
+    if x is None:
+        x = table.comoving_distance(z)
+
+    if p_of_z:
+        return x, z, 1/table.dxdz(z), z[1] - z[0]
+
+    xz = x
+    x = np.linspace(x[0],x[-1],znum)
+    z = np.interp(x, xz, z)
+    return x, z, np.ones_like(x), x[1] - x[0]
+
+
+def _eval_p(p, x, z, check_p_norm, p_of_z):
+    "A distribution, (optionally) normalised, on the grid of a Limber integral"
+    if check_p_norm:
+        p = _check_p(p,z if p_of_z else x)
+    return p(z) if p_of_z else p(x)
+
+
+def _z_interp_weights(z_nodes, z):
+    """
+    Weights of linear interpolation from `z_nodes` to `z`, of shape (len(z_nodes), len(z)).
+    Beyond the nodes, the nearest node is used.
+    """
+    return np.array([np.interp(z, z_nodes, e) for e in np.eye(len(z_nodes))])
 
-    integrand = np.einsum("kij,i,j->kij", xi(R,**xi_kw).reshape((len(theta),len(x), len(u))), p_integ, u)
 
-    return 2*dblsimps(integrand,diff,dlnu)
+def _simps_weights(n):
+    """Simpson's rule weights (without the factor of dx/3) for an odd number of points n"""
+    w = np.ones(n)
+    w[1:n - 1:2] = 4
+    w[2:n - 1:2] = 2
+    return w
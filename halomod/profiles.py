@@ -4,11 +4,19 @@ import scipy.special as sp
 import scipy.integrate as intg
 from scipy.interpolate import InterpolatedUnivariateSpline as spline
 from scipy.interpolate import RectBivariateSpline
+from scipy import fftpack
 import mpmath
 from hmf._framework import Component
 from scipy.special import gammainc, gamma
 import os
 import warnings
+import special
+from tools import LRUCache, get_pool
+try:
+    from pathos import multiprocessing as mp
+    HAVE_POOL = True
+except ImportError:
+    HAVE_POOL = False
 
 def ginc(a,x):
     return gamma(a) * gammainc(a,x)
@@ -44,6 +52,33 @@ class Profile(Component):
     """
     _defaults={}
 
+    # Bounds and resolution (points per decade) of the tabulated enclosed mass.
+    _h_xmin = 1e-6
+    _h_xmax = 1e3
+    _h_res = 200
+
+    # Tables of the enclosed mass, keyed by class and parameter values, so that
+    # repeated instantiation (eg. within a HaloModel) does not re-integrate. Only
+    # the most recent are kept, so a chain over profile parameters does not grow it.
+    _h_tables = LRUCache(16)
+
+    # Whether to tabulate the self-convolution numerically (see _l_table), if no
+    # analytic _l is defined. Only possible for truncated profiles. The table is
+    # accurate to ~3e-3, so it is opt-in: set this to True on a (sub)class to
+    # compute the 1-halo correlations in real space, rather than by transforming
+    # the 1-halo power.
+    _l_tabulate = False
+
+    # Concentration range and resolution (points per decade) of the tabulated
+    # self-convolution, and the number of radial points per halo radius.
+    _l_cmin = 0.1
+    _l_cmax = 100.0
+    _l_res = 20
+    _l_nx = 1024
+
+    # Tables of the self-convolution, keyed by class and parameter values (the most recent only).
+    _l_tables = LRUCache(16)
+
     def __init__(self, cm_relation, mean_dens,
                  delta_halo=200.0, z=0.0,**model_parameters):
 
@@ -52,7 +87,7 @@ class Profile(Component):
         self._cm_relation = cm_relation
         self.mean_dens = mean_dens
 
-        self.has_lam = hasattr(self, "_l")
+        self.has_lam = hasattr(self, "_l") or self._l_tabulate
 
         super(Profile, self).__init__(**model_parameters)
 
@@ -125,10 +160,47 @@ class Profile(Component):
         if m is not None:
             c = self.cm_relation(m)
 
-        x, dx = np.linspace(1e-6, c, 2000, retstep=True)
-        integrand = self._f(x) * x ** 2
+        c = np.asarray(c, dtype=float)
+        H = self._h_table(c.max())
+
+        # Anything below the bottom of the table has negligible enclosed mass.
+        lnc = np.log(np.clip(c, self._h_xmin, None))
+        h = H(lnc.flatten()).reshape(c.shape)
+        h[c <= self._h_xmin] = 0.0
+
+        if h.ndim == 0:
+            return float(h)
+        return h
+
+    def _h_table(self, xmax=None):
+        """
+        A spline of the cumulative integral of f(x)*x^2, as a function of ln(x).
+
+        The integral is performed once per profile class and set of parameters,
+        on a log-spaced grid in x, and cached. Evaluating it at any array of
+        concentrations is then a single spline evaluation.
+
+        Parameters
+        ----------
+        xmax : float, optional
+            The largest x required. The table is extended if it does not yet
+            reach this value.
+        """
+        key = (self.__class__, tuple(sorted(self.params.items())))
+        xmax = max(xmax or self._h_xmax, self._h_xmax)
+
+        if key in self._h_tables and self._h_tables[key][0] >= xmax:
+            return self._h_tables[key][1]
+
+        nx = int(np.ceil(np.log10(xmax/self._h_xmin) * self._h_res)) + 1
+        lnx = np.linspace(np.log(self._h_xmin), np.log(xmax), nx)
+        x = np.exp(lnx)
+
+        # Integrate in ln(x), hence the extra factor of x.
+        H = spline(lnx, self._f(x) * x ** 3).antiderivative()
 
-        return intg.simps(integrand, dx=dx)
+        self._h_tables[key] = (xmax, H)
+        return H
 
     def _p(self, K, c):
         """
@@ -304,13 +376,103 @@ class Profile(Component):
         if self.has_lam:
             c, r_s, x = self._get_r_variables(r, m, c, coord)
             if norm in [None, "m"]:
-                lam = self._l(x, c) * r_s ** 3 * self._rho_s(c, r_s, norm) ** 2
+                if hasattr(self, "_l"):
+                    l = self._l(x, c)
+                else:
+                    l = self._l_tabulated(x, c)
+                lam = l * r_s ** 3 * self._rho_s(c, r_s, norm) ** 2
             else:
                 raise ValueError("norm must be None or 'm'")
         else:
             raise AttributeError("this profile has no self-convolution defined.")
         return self._reduce(lam)
 
+    def _l_tabulated(self, x, c):
+        """
+        The dimensionless self-convolution of the profile, interpolated from a table.
+
+        This is the numerical counterpart of an analytic ``_l``, and is used by
+        :meth:`lam` when the latter is not defined.
+
+        Parameters
+        ----------
+        x : float or array_like
+            The unit-less separation r/r_s. If 2D, the last axis must match `c`.
+
+        c : float or array_like
+            The concentration
+        """
+        x = np.asarray(x, dtype=float)
+        c = np.asarray(c, dtype=float) * np.ones_like(x)
+
+        table = self._l_table(c.min(), c.max())
+
+        # The table is in units of the halo radius, on which the convolution
+        # has support (0, 2].
+        s = x / c
+        l = table.ev(np.log(c.flatten()), np.clip(s.flatten(), 1.0 / self._l_nx, 2.0))
+        l = l.reshape(x.shape)
+        l[s >= 2] = 0.0
+
+        if l.ndim == 0:
+            return float(l)
+        return l
+
+    def _l_table(self, cmin=None, cmax=None):
+        """
+        A 2D spline of the dimensionless self-convolution, in ln(c) and x/c.
+
+        For each concentration on a log-spaced grid, the convolution of the
+        truncated profile with itself is performed as a product in fourier space,
+        using a pair of discrete sine transforms (the radial fourier transform
+        of a spherically symmetric function). The table is built once per
+        profile class and set of parameters, and extended if a concentration
+        outside its range is required.
+
+        Parameters
+        ----------
+        cmin, cmax : float, optional
+            The range of concentrations required.
+        """
+        key = (self.__class__, tuple(sorted(self.params.items())))
+        cmin = min(cmin or self._l_cmin, self._l_cmin)
+        cmax = max(cmax or self._l_cmax, self._l_cmax)
+
+        if key in self._l_tables:
+            tcmin, tcmax, table = self._l_tables[key]
+            if tcmin <= cmin and tcmax >= cmax:
+                return table
+            cmin, cmax = min(cmin, tcmin), max(cmax, tcmax)
+
+        nc = int(np.ceil(np.log10(cmax / cmin) * self._l_res)) + 1
+        lnc = np.linspace(np.log(cmin), np.log(cmax), nc)
+
+        # Grid in units of the halo radius, on which c falls exactly. The box
+        # is twice the support of the convolution, to avoid aliasing.
+        M = self._l_nx
+        N = 4 * M - 1
+        s = np.arange(1, N + 1) / float(M)
+        n = np.arange(1, N + 1)
+
+        lam = np.zeros((nc, 2 * M))
+        for i, cc in enumerate(np.exp(lnc)):
+            dx = cc / M
+            L = (N + 1) * dx
+            x = s * cc
+            k = np.pi * n / L
+
+            rf = np.zeros(N)
+            rf[:M] = x[:M] * self._f(x[:M])
+            rf[M - 1] *= 0.5  # trapezoidal weight at the truncation
+
+            F = 4 * np.pi * dx * fftpack.dst(rf, type=1) / (2 * k)
+            l = (np.pi / L) * fftpack.dst(k * F ** 2, type=1) / (4 * np.pi ** 2 * x)
+            lam[i] = l[:2 * M]
+
+        table = RectBivariateSpline(lnc, s[:2 * M], lam)
+        self._l_tables[key] = (cmin, cmax, table)
+        return table
+
     def cdf(self, r, c=None, m=None, coord='r'):
         """
         The cumulative distribution function, :math:`m(<x)/m_v`
@@ -339,7 +501,7 @@ class Profile(Component):
         """
         The concentration-mass relation
         """
-        return self._cm_relation.cm(m, self.z)
+        return self._cm_relation.concentration(m, self.z)
 
     def _get_r_variables(self, r, m, c=None, coord="r"):
         """
@@ -434,7 +596,9 @@ class Profile(Component):
             Array of positions of the tracers, centred around (0,0,0).
         """
         c, r_s, x = self._get_r_variables(np.linspace(0,1,1000), m, c, coord='s')
+        x = x.flatten()
 
+        # For profiles without an analytic _h, this is served by the cached table.
         cdf = self.cdf(x,c,m,coord='x')
         spl = spline(cdf,x,k=3)
 
@@ -451,6 +615,17 @@ class ProfileInf(Profile):
     """
     An extended profile (not truncated at x=c)
     """
+    # Range and resolution (points per decade) of tabulated transforms, see _p_tabulated.
+    _p_kmin = 1e-4
+    _p_kmax = 10 ** 3.2
+    _p_res = 30
+
+    # Tabulated transforms, keyed by class and parameter values (the most recent only).
+    _p_tables = LRUCache(16)
+
+    # The numerical self-convolution requires a truncated profile.
+    _l_tabulate = False
+
     def rho(self, r, m, norm=None, c=None, coord="r"):
         """
         The density at radius r of a halo of mass m.
@@ -476,9 +651,9 @@ class ProfileInf(Profile):
         """
         c, r_s, x = self._get_r_variables(r, m, c, coord)
 
-        rho = self._f(x) * self.rho_s(c, r_s, norm)
+        rho = self._f(x) * self._rho_s(c, r_s, norm)
 
-        return self._make_scalar(rho)
+        return self._reduce(rho)
 
     def u(self, k, m, norm=None, c=None, coord="k"):
         """
@@ -503,7 +678,7 @@ class ProfileInf(Profile):
             co-ordinates [units Mpc/h]. ``x`` is in units of the scale radius
             (r_vir = c), and ``s`` is in units of the virial radius (r_vir = 1).
         """
-        c, K = self._get_k_variables(k, m)
+        c, K = self._get_k_variables(k, m, c, coord)
 
         u = self._p(K) / self._h(c)
 
@@ -512,7 +687,7 @@ class ProfileInf(Profile):
         elif norm != "m":
             raise ValueError(str(norm) + "is not a valid value for norm")
 
-        return self._make_scalar(u)
+        return self._reduce(u)
 
     def _p(self, K):
         """
@@ -560,6 +735,48 @@ class ProfileInf(Profile):
 
         return res
 
+    def _p_tabulated(self, K):
+        """
+        The dimensionless fourier-transform, interpolated from a cached table.
+
+        Subclasses with a closed-form (but expensive) transform at a single
+        scalar K define it as ``_p_exact``, and serve ``_p`` from here.
+
+        The table is generated from ``_p_exact`` once per profile class and
+        set of parameters, on a log-spaced grid in K (in parallel if ``pathos``
+        is installed). It is interpolated linearly in log-log space, which
+        extrapolates above the table as a power-law. Below the table, the
+        transform of a profile falling as x^-3 diverges as -ln(K), so it is
+        extrapolated linearly in ln(K).
+
+        Parameters
+        ----------
+        K : float or array_like
+            The unit-less wavenumber k*r_s, of any shape.
+        """
+        key = (self.__class__, tuple(sorted(self.params.items())))
+
+        if key not in self._p_tables:
+            nk = int(np.ceil(np.log10(self._p_kmax/self._p_kmin) * self._p_res)) + 1
+            lnk = np.linspace(np.log(self._p_kmin), np.log(self._p_kmax), nk)
+
+            if HAVE_POOL:
+                res = get_pool().map(self._p_exact, np.exp(lnk))
+            else:
+                res = [self._p_exact(k) for k in np.exp(lnk)]
+
+            slope = (res[1] - res[0])/(lnk[1] - lnk[0])
+            self._p_tables[key] = (spline(lnk, np.log(res), k=1), lnk[0], res[0], slope)
+
+        fit, lnk0, p0, slope = self._p_tables[key]
+        lnK = np.log(np.asarray(K, dtype=float))
+        out = np.exp(fit(lnK.flatten())).reshape(lnK.shape)
+
+        low = lnK < lnk0
+        if np.any(low):
+            out[low] = p0 + slope*(lnK[low] - lnk0)
+        return out
+
     def lam(self, r, m, norm=None, c=None, coord='r'):
         """
         The density profile convolved with itself.
@@ -591,7 +808,7 @@ class ProfileInf(Profile):
                 raise ValueError("norm must be None or 'm'")
         else:
             raise AttributeError("this profile has no self-convolution defined.")
-        return self._make_scalar(lam)
+        return self._reduce(lam)
 
 
 class NFW(Profile):
@@ -709,24 +926,13 @@ class Moore(Profile):
         return c, r_s
 
 class MooreInf(Moore, ProfileInf):
-    def _p(self, K):
-        G = lambda k : mpmath.meijerg([[1. / 6., 5. / 12., 11. / 12.], []],
-                       [[1. / 6., 1. / 6., 5. / 12., 0.5, 2. / 3., 5. / 6., 11. / 12.], [0, 1. / 3.]],
-                       k ** 6 / 46656.0) / (4 * np.sqrt(3) * np.pi ** (5 / 2) * k)
-
-        if len(K.shape) == 2:
-            K1 = np.reshape(K, -1)
-            K1.sort()
-        else:
-            K1 = K
-        res = np.zeros(len(K[K < 10 ** 3.2]))
-        for i, k in enumerate(K1[K1 < 10 ** 3.2]):
-            res[i] = G(k)
-
-        fit = spline(np.log(K1[K1 < 10 ** 3.2]), np.log(res), k=1)
-        res = np.reshape(np.exp(fit(np.log(np.reshape(K, -1)))), (len(K[:, 0]), len(K[0, :])))
+    def _p_exact(self, K):
+        return float(mpmath.meijerg([[1. / 6., 5. / 12., 11. / 12.], []],
+                                    [[1. / 6., 1. / 6., 5. / 12., 0.5, 2. / 3., 5. / 6., 11. / 12.], [0, 1. / 3.]],
+                                    K ** 6 / 46656.0) / (4 * np.sqrt(3) * np.pi ** 2.5 * K))
 
-        return res
+    def _p(self, K):
+        return self._p_tabulated(K)
 
 class Constant(Profile):
     def _f(self, x):
@@ -739,38 +945,26 @@ class Constant(Profile):
         return (-c * K * np.cos(c * K) + np.sin(c * K)) / K ** 3
 
 class GeneralizedNFW(Profile):
-    def __init__(self, alpha, *args, **kwargs):
-        super(GeneralNFWLike, self).__init__(*args, **kwargs)
-        self.alpha = alpha
+    """
+    A generalized NFW profile, with inner slope ``alpha``.
 
-    def _f(self, x):
-        return 1.0 / (x ** self.alpha * (1 + x) ** (3 - self.alpha))
+    The enclosed mass is evaluated from the numerically tabulated integral of the profile.
+    """
+    _defaults = {"alpha": 1.0}
 
-    def _h(self, c):
-        c = np.complex(c)
-        f1 = -(-c) ** self.alpha * c ** self.alpha
-        f2 = mpmath.betainc(-c, 3 - self.alpha, self.alpha - 2)
-        return (f1 * f2).real
+    def _f(self, x):
+        a = self.params['alpha']
+        return 1.0 / (x ** a * (1 + x) ** (3 - a))
 
 class GeneralizedNFWInf(GeneralizedNFW, ProfileInf):
-    def _p(self, K):
-        G = lambda k : mpmath.meijerg([[(self.alpha - 2) / 2.0, (self.alpha - 1) / 2.0], []],
-                       [[0, 0, 0.5], [-0.5]],
-                       k ** 2 / 4) / (np.sqrt(np.pi) * sp.gamma(3 - self.alpha))
-
-        if len(K.shape) == 2:
-            K1 = np.reshape(K, -1)
-            K1.sort()
-        else:
-            K1 = K
-        res = np.zeros(len(K[K < 10 ** 3.2]))
-        for i, k in enumerate(K1[K1 < 10 ** 3.2]):
-            res[i] = G(k)
-
-        fit = spline(np.log(K1[K1 < 10 ** 3.2]), np.log(res), k=1)
-        res = np.reshape(np.exp(fit(np.log(np.reshape(K, -1)))), (len(K[:, 0]), len(K[0, :])))
+    def _p_exact(self, K):
+        a = self.params['alpha']
+        return float(mpmath.meijerg([[(a - 2) / 2.0, (a - 1) / 2.0], []],
+                                    [[0, 0, 0.5], [-0.5]],
+                                    K ** 2 / 4) / (np.sqrt(np.pi) * sp.gamma(3 - a) * 2 ** a))
 
-        return res
+    def _p(self, K):
+        return self._p_tabulated(K)
 
 
 class Einasto(Profile):
@@ -780,9 +974,14 @@ class Einasto(Profile):
     This profile has no analytic Fourier Transform. The numerical FT has been pre-computed and is by default
     used to interpolate to the correct solution. If the full numerical calculation is preferred, set the
     model parameter ``use_interp`` to `False`. The interpolation speeds up the calculation by at least 10 times.
+
+    The incomplete gamma function in the enclosed mass may likewise be tabulated by setting ``special_mode``
+    to "table" (see :mod:`halomod.special`).
     """
     _defaults = {"alpha":0.18,
-                 "use_interp":True}
+                 "use_interp":True,
+                 "special_mode":"exact",
+                 "special_tol":1e-6}
 
     def __init__(self,*args,**kwargs):
         super(Einasto,self).__init__(*args,**kwargs)
@@ -797,7 +996,8 @@ class Einasto(Profile):
 
     def _h(self,c):
         a = self.params['alpha']
-        return np.exp(2/a) * (2/a)**(-3./a)*ginc(3./a, (2./a)*c**a)/a
+        g = special.gammainc_lower(3./a, (2./a)*c**a, self.params['special_mode'], self.params['special_tol'])
+        return np.exp(2/a) * (2/a)**(-3./a)*g/a
 
     def _p(self,K,c):
         if self.params['use_interp']:
@@ -0,0 +1,167 @@
+"""
+Fast, tabulated versions of the special functions used by analytic profiles.
+
+Every function here takes a ``mode`` argument. In "exact" mode, the function is
+evaluated directly (via :mod:`scipy.special`). In "table" mode, it is linearly
+interpolated from a table which is built on first use and cached at module level.
+The resolution of each table is chosen such that the interpolation error is
+below ``tol``, and the achieved bound is available as the ``error_bound``
+attribute of the table (see :func:`get_table`).
+
+Only the incomplete gamma function (in the enclosed mass of the Einasto profile)
+is provided, for which the table is several times faster than
+:func:`scipy.special.gammainc`. Tabulating the sine and cosine integrals of the
+NFW and Hernquist transforms gains less than a factor of two over
+:func:`scipy.special.sici`, so those are always evaluated exactly.
+"""
+import numpy as np
+from scipy import special as sp
+from tools import LRUCache
+
+_MODES = ["exact", "table"]
+
+# Tables are cached per (name, tolerance, extra arguments). Only the most recent
+# are kept, since there is one table per value of (eg.) the Einasto alpha.
+_tables = LRUCache(16)
+
+
+class LogTable(object):
+    """
+    A function tabulated on a uniform grid in ln(x), and linearly interpolated.
+
+    The number of points is chosen from the maximum curvature of the tabulated
+    function, such that the relative interpolation error is at most `tol`.
+
+    Parameters
+    ----------
+    func : callable
+        A function of x, returning an array. Each column of ``func(x)``
+        (if 2D) is tabulated on the same grid.
+
+    xmin, xmax : float
+        Range of the table.
+
+    tol : float
+        Maximum relative error of interpolation.
+
+    log : bool, optional
+        Whether to tabulate (and interpolate) the logarithm of `func`.
+    """
+    def __init__(self, func, xmin, xmax, tol, log=False):
+        self.log = log
+        self.lnxmin = np.log(xmin)
+        self.lnxmax = np.log(xmax)
+
+        # Estimate the curvature on a probe grid.
+        lnx, dlnx = np.linspace(self.lnxmin, self.lnxmax, 4001, retstep=True)
+        y = self._tabulate(func, lnx)
+        curv = np.abs(np.diff(y, 2, axis=0))/dlnx**2
+        if not log:
+            curv /= np.abs(y[1:-1])
+        curv = curv.max()
+
+        n = int(np.ceil((self.lnxmax - self.lnxmin)*np.sqrt(curv/(8*tol)))) + 2
+        if n > 1e7:
+            raise ValueError("tolerance %s is too small to tabulate" % tol)
+
+        lnx, self.dlnx = np.linspace(self.lnxmin, self.lnxmax, n, retstep=True)
+        y = self._tabulate(func, lnx)
+
+        self.n = n
+        self.error_bound = curv*self.dlnx**2/8
+        self._y = [np.ascontiguousarray(yy[:-1]) for yy in y.T]
+        self._dy = [np.ascontiguousarray(yy) for yy in np.diff(y, axis=0).T]
+
+    def _tabulate(self, func, lnx):
+        y = np.array(func(np.exp(lnx)), dtype=float).T.reshape((len(lnx), -1))
+        if self.log:
+            y = np.log(y)
+        return y
+
+    def locate(self, lnx):
+        """
+        Indices and fractional offsets of ln(x) in the table, clipped to its range.
+        """
+        t = (lnx - self.lnxmin)*(1.0/self.dlnx)
+        np.clip(t, 0, self.n - 1.000001, out=t)
+        i = t.astype(np.intp)
+        t -= i
+        return i, t
+
+    def interp(self, i, t, col=0):
+        """Interpolate column `col` of the table at the output of :meth:`locate`"""
+        y = np.take(self._y[col], i) + t*np.take(self._dy[col], i)
+        if self.log:
+            return np.exp(y)
+        return y
+
+    def in_range(self, lnx):
+        return lnx.min() >= self.lnxmin and lnx.max() <= self.lnxmax
+
+
+def _check_mode(mode):
+    if mode not in _MODES:
+        raise ValueError("mode must be one of %s" % _MODES)
+
+
+def get_table(name, tol, *args):
+    """
+    Return the (cached) table for special function `name`, with tolerance `tol`.
+
+    Parameters
+    ----------
+    name : str, {"gammainc"}
+        The function.
+
+    tol : float
+        Tolerance of the table.
+
+    args :
+        Any further (fixed) arguments of the function, eg. `a` for "gammainc".
+    """
+    key = (name, tol) + args
+    if key not in _tables:
+        if name == "gammainc":
+            a = args[0]
+            # Beyond this, the incomplete gamma function is complete to within tol.
+            xmax = sp.gammaincinv(a, 1 - tol/10)
+            _tables[key] = LogTable(lambda x: sp.gammainc(a, x), 1e-8*a, xmax, tol, log=True)
+        else:
+            raise ValueError("no table for %s" % name)
+    return _tables[key]
+
+
+def gammainc_lower(a, x, mode="exact", tol=1e-6):
+    """
+    The (non-regularized) lower incomplete gamma function, :math:`\\gamma(a,x)`.
+
+    Parameters
+    ----------
+    a : float
+        Parameter of the function. Tables are cached per value of `a`.
+
+    x : array_like
+        Positive arguments.
+
+    mode : str, {"exact", "table"}
+        Whether to evaluate exactly, or interpolate from a table.
+
+    tol : float, optional
+        Maximum relative error of the table. Only used if `mode` is "table".
+    """
+    _check_mode(mode)
+    if mode == "exact":
+        return sp.gamma(a)*sp.gammainc(a, x)
+
+    x = np.asarray(x, dtype=float)
+    tab = get_table("gammainc", tol, a)
+    lnx = np.log(np.clip(x, 1e-300, None))
+    i, t = tab.locate(lnx)
+    out = tab.interp(i, t)
+
+    # Below the table, the function is a power law. Above it, it is complete.
+    lo = lnx < tab.lnxmin
+    if np.any(lo):
+        out[lo] = sp.gammainc(a, x[lo])
+    out[lnx > tab.lnxmax] = 1.0
+    return sp.gamma(a)*out
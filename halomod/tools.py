@@ -8,6 +8,8 @@ import scipy.integrate as intg
 from scipy.stats import poisson
 import time
 from scipy.interpolate import InterpolatedUnivariateSpline as spline
+from scipy import special as sp
+from collections import OrderedDict
 try:
     from pathos import multiprocessing as mp
     HAVE_POOL = True
@@ -15,6 +17,82 @@ except ImportError:
     HAVE_POOL = False
 
 
+class LRUCache(object):
+    """
+    A mapping holding at most `maxsize` items, which discards the least-recently
+    used item when full.
+
+    This is used for tables cached per cosmology, so that (eg.) a chain over
+    cosmological parameters does not accumulate them without limit.
+    """
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+    def __getitem__(self, key):
+        value = self._data.pop(key)
+        self._data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+# The pool of worker processes shared by every parallel tabulation (see get_pool).
+_pool = []
+
+
+def get_pool():
+    """
+    The ``pathos`` pool of worker processes, which is created on first use and then
+    re-used, rather than starting (and leaving open) a new pool for every map.
+    Requires ``pathos`` (see ``HAVE_POOL``).
+    """
+    if not _pool:
+        _pool.append(mp.ProcessingPool(mp.cpu_count()))
+    return _pool[0]
+
+
+# Nodes and weights of the Hankel transforms, which are re-used by every call.
+_ogata_plans = {}
+_fftlog_plans = {}
+
+
+def _ogata_plan(N, h):
+    """The nodes, and weights, of Ogata's quadrature for the 3D transform"""
+    if (N, h) not in _ogata_plans:
+        roots = np.arange(1, N + 1)
+        t = h*roots
+        s = np.pi*np.sinh(t)
+        x = np.pi*roots*np.tanh(s/2)
+
+        dpsi = 1 + np.cosh(s)
+        dpsi[dpsi != 0] = (np.pi*t*np.cosh(t) + np.sinh(s))/dpsi[dpsi != 0]
+        _ogata_plans[(N, h)] = (x, np.pi*np.sin(x)*dpsi*x)
+    return _ogata_plans[(N, h)]
+
+
+def _fftlog_plan(n, dlnk, q):
+    """The frequencies, and Mellin transform of J0 at each, of an FFTLog transform"""
+    if (n, dlnk, q) not in _fftlog_plans:
+        s = q + 2j*np.pi*np.arange(n//2 + 1)/(n*dlnk)
+        u = np.exp((s - 1)*np.log(2) + sp.loggamma(s/2) - sp.loggamma(1 - s/2))
+        _fftlog_plans[(n, dlnk, q)] = (s, u)
+    return _fftlog_plans[(n, dlnk, q)]
+
+
 def power_to_corr_ogata(power, k, r, N=640, h=0.005):
     """
     Use Ogata's method for Hankel Transforms in 3D for nu=0 (nu=1/2 for 2D)
@@ -22,14 +100,7 @@ def power_to_corr_ogata(power, k, r, N=640, h=0.005):
     """
     lnk = np.log(k)
     spl = spline(lnk, power)
-    roots = np.arange(1, N + 1)
-    t = h*roots
-    s = np.pi*np.sinh(t)
-    x = np.pi*roots*np.tanh(s/2)
-
-    dpsi = 1 + np.cosh(s)
-    dpsi[dpsi != 0] = (np.pi*t*np.cosh(t) + np.sinh(s))/dpsi[dpsi != 0]
-    sumparts = np.pi*np.sin(x)*dpsi*x
+    x, sumparts = _ogata_plan(N, h)
 
     allparts = sumparts*spl(np.log(np.divide.outer(x, r))).T
     return np.sum(allparts, axis=-1)/(2*np.pi**2*r**3)
@@ -44,14 +115,7 @@ def power_to_corr_ogata_matrix(power, k, r, N=640, h=0.005):
     faster for less recalculations than looping over the original.
     """
     lnk = np.log(k)
-    roots = np.arange(1, N + 1)
-    t = h*roots
-    s = np.pi*np.sinh(t)
-    x = np.pi*roots*np.tanh(s/2)
-
-    dpsi = 1 + np.cosh(s)
-    dpsi[dpsi != 0] = (np.pi*t*np.cosh(t) + np.sinh(s))/dpsi[dpsi != 0]
-    sumparts = np.pi*np.sin(x)*dpsi*x
+    x, sumparts = _ogata_plan(N, h)
 
     out = np.zeros(len(r))
     for ir, rr in enumerate(r):
@@ -61,6 +125,73 @@ def power_to_corr_ogata_matrix(power, k, r, N=640, h=0.005):
     return out
 
 
+def power_to_wp_fftlog(power, k, rp, q=0.5):
+    """
+    Use the FFTLog algorithm (Hamilton 2000) to compute the J0 Hankel transform
+    of a given power spectrum, i.e. the projected correlation function for an
+    infinite line-of-sight limit,
+
+    .. math :: w_p(r_p) = \\frac{1}{2\\pi}\\int_0^\\infty k P(k) J_0(k r_p) dk.
+
+    All scales are obtained from a single FFT, on the reciprocal grid of `k`, and
+    are then interpolated to `rp`.
+
+    Parameters
+    ----------
+    power : array_like
+        The power spectrum at `k`. It should have decayed by the ends of the range
+        of `k`, otherwise the transform will ring.
+
+    k : array_like
+        Wavenumbers, which should be log-spaced (otherwise the power is first
+        interpolated onto a log-spaced grid).
+
+    rp : array_like
+        Projected separations at which to return the transform.
+
+    q : float, optional
+        Power-law bias of the transform, which must be in (0, 1.5).
+    """
+    lnk = np.log(k)
+    n = len(k)
+    dlnk = (lnk[-1] - lnk[0])/(n - 1)
+    if not np.allclose(np.diff(lnk), dlnk):
+        power = spline(lnk, power)(np.linspace(lnk[0], lnk[-1], n))
+        lnk = np.linspace(lnk[0], lnk[-1], n)
+
+    # Mellin transform of J0, at each frequency of the (biased) integrand
+    s, u = _fftlog_plan(n, dlnk, q)
+
+    lnr = -lnk[::-1]
+    a = np.exp((2 - q)*lnk)*power/(2*np.pi)
+    b = np.fft.rfft(a)*u*np.exp(-1j*s.imag*(lnk[0] + lnr[0]))
+    wp = np.exp(-q*lnr)*np.fft.irfft(np.conj(b), n)
+    return spline(lnr, wp)(np.log(rp))
+
+
+def simps_weights(n, dx):
+    """
+    Weights w of Simpson's rule on n equally spaced points, so that ``np.dot(w, y)``
+    equals ``intg.simps(y, dx=dx)``. For even n, this is the average of the two
+    ways of closing the rule with a trapezoid, as scipy does by default.
+    """
+    def odd(n):
+        w = np.ones(n) if n > 1 else np.zeros(n)
+        w[1:n - 1:2] = 4
+        w[2:n - 1:2] = 2
+        return w*dx/3.0
+
+    if n%2:
+        return odd(n)
+
+    w = np.zeros(n)
+    w[:-1] += odd(n - 1)
+    w[-2:] += dx/2.0
+    w[1:] += odd(n - 1)
+    w[:2] += dx/2.0
+    return w/2.0
+
+
 def power_to_corr(power_func, R):
     """
     Calculate the correlation function given a power spectrum
@@ -213,10 +344,13 @@ def populate(centres, masses, halomodel=None, profile=None, hodmod=None, edges=N
     halo[ncen:] = np.repeat(sat_halos,sgal)
     indx = np.concatenate(([0],np.cumsum(sgal))) + ncen
 
+    # Evaluate the concentrations of all halos at once, rather than per halo.
+    conc = np.atleast_1d(profile.cm_relation(masses))
+
 #    print "SMASHING THIS NOW"
     def fill_array(i):
         m,n,ctr = masses[i], sgal[i],centres[i]
-        pos[indx[i]:indx[i+1],:] = profile.populate(n, m, ba=1, ca=1, centre=ctr)
+        pos[indx[i]:indx[i+1],:] = profile.populate(n, m, c=conc[i], ba=1, ca=1, centre=ctr)
 
     if HAVE_POOL:
         mp.ProcessingPool(mp.cpu_count()).map(fill_array,range(len(masses)))
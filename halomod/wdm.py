@@ -39,11 +39,15 @@ def CMRelationWDMRescaled(name, **kwargs):
         b1 = self.params['beta1']
         return cm*(1 + g1*self.m_hm/m) ** (-g2)*(1 + z) ** (b0*z - b1)
 
+    def _cm_key(self):
+        return super(self.__class__, self)._cm_key() + (self.m_hm,)
+
     K = type(name + "WDM", (x,), {})
     K._defaults.update({"g1": 60, "g2": 0.17, "beta0": 0.026, "beta1": 0.04})
 
     K.__init__ = __init__
     K.cm = cm
+    K._cm_key = _cm_key
     return K(**kwargs)
 
 
@@ -92,7 +96,7 @@ class HaloModelWDM(HaloModel, MassFunctionWDM):
 
     @cached_quantity
     def power_mm_sh(self):
-        integrand = self.m ** 2*self.dndm*self.bias*self.profile.u(self.k, self.m, norm="m")
+        integrand = self.m ** 2*self.dndm*self.bias*self.profile_ukm
         pch = intg.simps(integrand, dx=np.log(10)*self.dlog10m)
         return self.bias_smooth*self._power_halo_centres*pch/self.rho_gtm[0]
 
@@ -112,7 +116,8 @@ class HaloModelWDM(HaloModel, MassFunctionWDM):
 
         kwargs = dict(filter0=this_filter, mean_density0=self.mean_density0,
                       growth=self.growth, delta_c=self.delta_c, profile=this_profile,
-                      cosmo=self.cosmo, delta_halo=self.delta_halo, **self.concentration_params)
+                      cosmo=self.cosmo, delta_halo=self.delta_halo, sigma_table=self.sigma_table,
+                      **self.concentration_params)
 
         if np.issubclass_(self.concentration_model, CMRelation):
             if self.concentration_model.__class__.__name__.endswith("WDM"):
@@ -0,0 +1,58 @@
+"""
+Tests of the bias models.
+"""
+import numpy as np
+from halomod import bias
+
+nu = np.linspace(0.1, 10, 50)
+
+
+def test_batched_params():
+    q = np.array([0.6, 0.707, 0.8])
+    batch = bias.ST99(nu=nu, delta_c=1.686, q=q).bias()
+    assert batch.shape == (3, len(nu))
+    for i, qq in enumerate(q):
+        assert np.allclose(batch[i], bias.ST99(nu=nu, delta_c=1.686, q=qq).bias())
+
+
+
+def _check_batch(model, params, **kwargs):
+    batch = model(nu=nu, delta_c=1.686, **dict(kwargs, **params)).bias()
+    n = len(list(params.values())[0])
+    assert batch.shape == (n, len(nu))
+    for i in range(n):
+        single = dict((k, v[i]) for k, v in params.items())
+        assert np.allclose(batch[i], model(nu=nu, delta_c=1.686, **dict(kwargs, **single)).bias())
+
+
+def test_batched_params_models():
+    m = np.logspace(10, 15, len(nu))
+    _check_batch(bias.SMT01, {"a": [0.6, 0.707], "c": [0.5, 0.6]})
+    _check_batch(bias.Tinker10, {"B": [0.1, 0.183, 0.2], "b": [1.4, 1.5, 1.6]}, delta_halo=200.0)
+    _check_batch(bias.Seljak04, {"a": [0.5, 0.53], "g": [1.4, 1.5]}, m=m, mstar=1e12)
+    _check_batch(bias.Jing98, {"a": [0.4, 0.5]}, m=m, mstar=1e12, n=-1.5)
+    _check_batch(bias.Pillepich10, {"B0": [0.6, 0.647], "B2": [0.5, 0.568]})
+
+
+def test_batched_params_length():
+    try:
+        bias.Tinker10(nu=nu, delta_c=1.686, delta_halo=200, B=[0.1, 0.2], b=[1.4, 1.5, 1.6]).bias()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("mismatched parameter arrays should raise ValueError")
+
+
+def test_pbsplit_tabulated_delta():
+    b = bias.Tinker10_PBsplit(nu=nu, delta_c=1.686, delta_halo=400.0, z=0.0)
+    beta, gamma, phi, eta = [b.params["%s_400" % x] for x in ["beta", "gamma", "phi", "eta"]]
+    direct = 1 + (gamma * nu - (1 + 2 * eta)) / 1.686 + 2 * phi / 1.686 / (1 + (beta ** 2 * nu) ** phi)
+    assert np.allclose(b.bias(), direct)
+
+
+def test_pbsplit_array_delta():
+    delta = np.array([250.0, 500.0, 2000.0])
+    batch = bias.Tinker10_PBsplit(nu=nu, delta_c=1.686, delta_halo=delta, z=0.5).bias()
+    assert batch.shape == (3, len(nu))
+    for i, d in enumerate(delta):
+        assert np.allclose(batch[i], bias.Tinker10_PBsplit(nu=nu, delta_c=1.686, delta_halo=d, z=0.5).bias())
@@ -0,0 +1,77 @@
+"""
+Tests of the concentration-mass relations, and their cached machinery.
+"""
+import numpy as np
+from hmf import filters, growth_factor
+from astropy.cosmology import Planck15
+from halomod import concentration
+
+
+def get_cm(model=concentration.Bullock01_Power, **kwargs):
+    k = np.logspace(-4, 3, 800)
+    power = 5.34e6 * k / (1 + (k / 0.02) ** 2) ** 1.4
+    return model(filter0=filters.TopHat(k, power), mean_density0=8.5e10,
+                 growth=growth_factor.GrowthFactor(Planck15), **kwargs)
+
+
+def test_mass_nonlinear():
+    cm = get_cm()
+    z = np.array([0.0, 1.0, 2.5])
+    mstar = cm.mass_nonlinear(z)
+    r = cm.filter.mass_to_radius(mstar, cm.mean_density0)
+    g = np.array([cm.growth.growth_factor(zz) for zz in z])
+    assert np.allclose(cm.filter.sigma(r) * g, cm.delta_c, rtol=1e-4)
+
+
+def test_mass_nonlinear_scalar():
+    cm = get_cm()
+    assert np.isclose(cm.mass_nonlinear(1.0), cm.mass_nonlinear(np.array([1.0]))[0])
+
+
+def test_sigma_table():
+    cm = get_cm()
+    r = np.logspace(-3.5, 1.5, 20)
+    assert np.allclose(cm._sigma(r), cm.filter.sigma(r), rtol=1e-5)
+
+
+def test_sigma_table_seeded():
+    cm = get_cm()
+    lnr = np.linspace(np.log(0.1), np.log(10.0), 100)
+    seed = (lnr, np.log(cm.filter.sigma(np.exp(lnr))))
+
+    concentration.CMRelation._sigma_tables.clear()
+    cm = get_cm(sigma_table=seed)
+    assert np.isin(lnr, cm._sigma_table()[0]).all()
+
+    r = np.logspace(-3.5, 1.5, 20)
+    assert np.allclose(cm._sigma(r), cm.filter.sigma(r), rtol=1e-5)
+
+
+def test_bullock01_zc():
+    cm = get_cm(concentration.Bullock01)
+    m = np.logspace(10, 15, 10)
+    r = cm.filter.mass_to_radius(cm.params["F"] * m, cm.mean_density0)
+    zc = cm.growth.growth_factor_fn(inverse=True)(np.sqrt(cm.filter.nu(r, cm.delta_c)))
+    zc[zc < 0] = 0
+    assert np.allclose(cm.zc(m), zc, rtol=1e-4)
+
+
+def get_ludlow(**kwargs):
+    from halomod import profiles
+    return get_cm(concentration.Ludlow2016, profile=profiles.NFW(None, 8.5e10),
+                  cosmo=Planck15, **kwargs)
+
+
+def test_cm_table():
+    cm = get_ludlow()
+    m = np.logspace(10, 15, 30)
+    assert np.all(cm.concentration(m, 0.0) == cm.cm(m, 0.0))
+
+    cm.tabulate = True
+    for z in [0.0, 0.37]:
+        assert np.allclose(cm.concentration(m, z), cm.cm(m, z), rtol=1e-3)
+
+
+def test_cm_table_rebuilds():
+    assert get_ludlow().table is get_ludlow().table
+    assert get_ludlow(C=700).table is not get_ludlow().table
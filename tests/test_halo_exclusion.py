@@ -0,0 +1,47 @@
+"""
+Tests of the cross-sample integrals of the halo exclusion models.
+"""
+import numpy as np
+from halomod import halo_exclusion as he
+
+
+def _models(model):
+    m = np.logspace(10, 15, 101)
+    r = np.logspace(-1, 1, 5)
+    k = np.logspace(-2, 1, 4)
+    u = np.exp(-np.outer(k, (m/1e12)**(1./3)))
+    dndm = m**-1.9
+    bias = 1 + m/1e13
+
+    out = []
+    for n in [m/1e12, np.sqrt(m/1e11)]:
+        density = n*dndm
+        I = density*u/np.trapz(density*m, np.log(m))
+        out.append(model(m=m, density=density, I=I, bias=bias, r=r, delta_halo=200.0,
+                         mean_density=1e11))
+    return out
+
+
+def test_cross_of_self():
+    for model in [he.NoExclusion, he.Sphere, he.DblSphere, he.DblEllipsoid, he.NgMatched]:
+        a, b = _models(model)
+        assert np.allclose(a.integrate_cross(a), a.integrate())
+
+
+def test_cross_no_exclusion():
+    a, b = _models(he.NoExclusion)
+    assert np.allclose(a.integrate_cross(b)**2, a.integrate()*b.integrate())
+
+
+def test_cross_dblsphere_bilinear():
+    a, b = _models(he.DblSphere)
+    a.integrate()
+    direct = np.zeros_like(a.integrate())
+    ia = a.I*a.bias*a.m
+    ib = b.I*b.bias*b.m
+    for ir in range(len(a.r)):
+        for ik in range(len(ia)):
+            integrand = np.outer(ia[ik], ib[ik])
+            integrand[a.mask[ir]] = 0
+            direct[ir, ik] = he.dblsimps(integrand, a.dlnx)
+    assert np.allclose(a.integrate_cross(b), direct)
@@ -0,0 +1,154 @@
+"""
+Tests of HaloModel.
+"""
+import numpy as np
+import scipy.integrate as intg
+from halomod import HaloModel, profiles, tools
+
+
+class TabulatedEinasto(profiles.Einasto):
+    _l_tabulate = True
+
+
+def _model(central):
+    # The second sample has the higher M_min, so the common mass range is that of `hod`.
+    return HaloModel(hod_model="Zheng05", hod_params={"M_min": 11.5, "central": central},
+                     hod_samples=[{"M_min": 12.5, "central": central}])
+
+
+def test_cross_diagonal_central():
+    h = _model(True)
+    assert h.profile.has_lam
+    assert np.allclose(h.corr_gg_1h_cross[0, 0], h.corr_gg_1h)
+
+
+def test_cross_diagonal_no_central():
+    h = _model(False)
+    assert np.allclose(h.corr_gg_1h_cross[0, 0], h.corr_gg_1h)
+
+
+def test_cross_symmetric():
+    h = _model(True)
+    assert np.allclose(h.corr_gg_1h_cross[0, 1], h.corr_gg_1h_cross[1, 0])
+
+
+def test_corr_mm_1h_lam_table():
+    # The real-space route, with the tabulated self-convolution, against the
+    # transform of the 1-halo power.
+    kspace = HaloModel(profile_model="Einasto")
+    table = HaloModel(profile_model=TabulatedEinasto)
+    assert table.profile.has_lam and not kspace.profile.has_lam
+
+    r = (kspace.r > 0.05) & (kspace.r < 1.0)
+    assert np.allclose(table.corr_mm_1h[r], kspace.corr_mm_1h[r], rtol=5e-2)
+
+
+def test_hod_mmin_prior_no_recompute():
+    h = HaloModel(Mmin=12, hod_mmin_prior=10, hod_params={"M_min": 11.5})
+    dndm, u = h.dndm, h.profile_ukm
+    h.mean_gal_den
+    h.update(hod_params={"M_min": 10.5})
+    h.mean_gal_den
+    assert h.dndm is dndm and h.profile_ukm is u
+
+
+def test_hod_mmin_prior_matches_mmin():
+    h = HaloModel(Mmin=12, hod_mmin_prior=10, hod_params={"M_min": 10.5})
+    direct = HaloModel(Mmin=10, hod_params={"M_min": 10.5})
+    assert np.allclose(h.m, direct.m)
+    assert np.isclose(h.mean_gal_den, direct.mean_gal_den)
+    assert np.allclose(h.power_gg_1h, direct.power_gg_1h)
+    assert np.allclose(h.corr_gg_1h, direct.corr_gg_1h)
+
+
+def test_hod_below_mass_grid():
+    h = HaloModel(Mmin=12, hod_params={"M_min": 11.5})
+    try:
+        h.mean_gal_den
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("an HOD requiring masses below the grid should raise ValueError")
+
+
+def test_concentration_once():
+    h = HaloModel()
+    calls = []
+    cm = h.cm.cm
+    h.cm.cm = lambda m, z=0: calls.append(1) or cm(m, z)
+
+    h.profile_ukm, h.profile_rho, h.profile_lam
+    h.power_mm_1h, h.corr_mm_1h, h.corr_gg_1h
+    assert len(calls) == 1
+
+
+def test_galaxy_mask_views():
+    # The cached slice views against boolean indexing, as galaxy statistics used.
+    h = HaloModel(hod_params={"M_min": 12.0})
+    gm = h.m >= 10 ** h.hod.mmin
+    m, dndm = h.m[gm], h.dndm[gm]
+    assert np.all(h._gm_m == m)
+    assert np.all(h._gm_ukm == h.profile_ukm[:, gm])
+
+    dx = h.dlog10m*np.log(10)
+    ng = intg.trapz(m*dndm*h.n_tot[gm], dx=dx)
+    assert np.isclose(h.mean_gal_den, ng, rtol=1e-10)
+
+    integ = m*dndm*(h.hod.ss_pairs(m)*h.profile_lam[:, gm] + 2*h.hod.cs_pairs(m)*h.profile_rho[:, gm])
+    assert np.allclose(h.corr_gg_1h, intg.trapz(integ, dx=dx)/ng ** 2 - 1, rtol=1e-6)
+
+
+def _check_power_gg_2h_batch(**kwargs):
+    h = HaloModel(bias_model="Tinker10", **kwargs)
+    B, b = np.array([0.15, 0.183, 0.2]), np.array([1.4, 1.5, 1.6])
+    batch = h.power_gg_2h_batch(B=B, b=b)
+    for i in range(len(B)):
+        h.update(bias_params={"B": B[i], "b": b[i]})
+        assert np.allclose(batch[i], h.power_gg_2h)
+
+
+def test_power_gg_2h_batch():
+    _check_power_gg_2h_batch(exclusion_model="NoExclusion", sd_bias_model=None)
+
+
+def test_power_gg_2h_batch_exclusion():
+    _check_power_gg_2h_batch()
+
+
+def test_power_hh_bins():
+    # Against the mean bias of each bin from Simpson's rule over the masses within it,
+    # as power_hh used to compute it. Bin edges fall between grid points, hence rtol.
+    h = HaloModel()
+    edges = np.array([11.0, 12.0, 13.0, 14.0])
+    p = h.power_hh_bins(edges)
+    assert p.shape == (3, 3, len(h.k))
+
+    b = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        mask = (h.m >= 10 ** lo) & (h.m <= 10 ** hi)
+        b.append(intg.simps(h.bias[mask]*h.dndm[mask], h.m[mask])/intg.simps(h.dndm[mask], h.m[mask]))
+
+    for i in range(3):
+        assert np.allclose(p[i, i], h.power_hh(edges[i], edges[i + 1]), rtol=1e-10)
+        for j in range(3):
+            assert np.allclose(p[i, j], b[i]*b[j]*h._power_halo_centres, rtol=1e-3)
+
+
+def test_corr_hh_bins():
+    h = HaloModel()
+    edges = [11.0, 12.5, 14.0]
+    p = h.power_hh_bins(edges)
+    xi = h.corr_hh_bins(edges)
+    for i in range(2):
+        for j in range(2):
+            assert np.allclose(xi[i, j], tools.power_to_corr_ogata(p[i, j], h.k, h.r), rtol=1e-8)
+
+
+def test_bias_binned_empty():
+    h = HaloModel()
+    try:
+        h.bias_binned([19.0, 20.0])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a bin outside the mass grid should raise ValueError")
@@ -10,8 +10,11 @@ import os
 import sys
 #sys.path.insert(0, LOCATION)
 import numpy as np
-from halomod import ProjectedCF
-from halomod.integrate_corr import projected_corr_gal
+from halomod import HaloModel, ProjectedCF, AngularCF, TomographicCF
+from halomod.integrate_corr import projected_corr_gal, adaptive_r_grid, angular_corr_gal, DistanceTable, \
+    angular_corr_gal_hankel, angular_power_gal, flat_z_dist
+from astropy.cosmology import Planck15
+from scipy.special import k0
 from astropy.units import Mpc
 from mpmath import gamma,hyp2f1
 
@@ -49,3 +52,147 @@ class TestProjCorr():
         wprp_anl = wprp_pl_lim(self.rp,self.r0,self.g,50.0)
         wprp = projected_corr_gal(h.r, xir, h.rlim, self.rp)
         assert np.all(abs(wprp-wprp_anl)/wprp_anl<0.01)
+
+
+def test_projected_corr_gal_power_law():
+    r = np.logspace(-3, 3, 300)
+    rp = np.logspace(-2, 0, 20)
+    wprp = projected_corr_gal(r, (r/5.14)**-1.85, 1000.0, rp)
+    wprp_anl = wprp_pl(rp, 5.14, 1.85).astype(float)
+    assert np.allclose(wprp, wprp_anl, rtol=0.01)
+
+
+def test_adaptive_r_grid():
+    rp = np.logspace(-2, 0, 20)
+    xi = lambda r: (r/5.14)**-1.85
+    r = adaptive_r_grid(xi, rp, 1000.0, tol=1e-3)
+    wprp = projected_corr_gal(r, xi(r), 1000.0, rp)
+    wprp_anl = wprp_pl(rp, 5.14, 1.85).astype(float)
+    assert np.allclose(wprp, wprp_anl, rtol=0.01)
+
+
+def test_angular_corr_gal_hankel():
+    # The correlation function K0(a*r)/(2 pi^2) has power 1/(k^2+a^2)^(3/2).
+    a = 0.1
+    k = np.exp(np.arange(-18, 9.9, 0.05))
+    theta = np.logspace(-3, 0, 10)*np.pi/180
+    p = flat_z_dist(0.2, 0.4)
+    w_real = angular_corr_gal(theta, lambda r: k0(a*r)/(2*np.pi**2), p, 0.2, 0.4, -4, 2.3,
+                              unum=400, cosmo=Planck15)
+    w_hankel = angular_corr_gal_hankel(theta, 1/(k**2 + a**2)**1.5, k, p, 0.2, 0.4, cosmo=Planck15)
+    assert np.allclose(w_hankel, w_real, rtol=1e-3)
+
+
+
+def test_angular_corr_gal_hankel_zmin_zero():
+    # The node at z=0 has zero separation, where the projected correlation diverges.
+    a = 0.1
+    k = np.exp(np.arange(-18, 9.9, 0.05))
+    theta = np.logspace(-3, 0, 10)*np.pi/180
+    p = flat_z_dist(0.0, 0.4)
+    w_real = angular_corr_gal(theta, lambda r: k0(a*r)/(2*np.pi**2), p, 0.0, 0.4, -4, 2.3,
+                              unum=400, cosmo=Planck15)
+    w_hankel = angular_corr_gal_hankel(theta, 1/(k**2 + a**2)**1.5, k, p, 0.0, 0.4, cosmo=Planck15)
+    assert np.all(np.isfinite(w_hankel))
+    assert np.allclose(w_hankel, w_real, rtol=2e-2)
+
+
+def test_angular_corr_gal_chunks():
+    # With max_memory too small for more than one theta per chunk.
+    xi = lambda r: k0(0.1*r)/(2*np.pi**2)
+    theta = np.logspace(-3, 0, 10)*np.pi/180
+    p = flat_z_dist(0.2, 0.4)
+    w = angular_corr_gal(theta, xi, p, 0.2, 0.4, -4, 2.3, cosmo=Planck15)
+    w_chunked = angular_corr_gal(theta, xi, p, 0.2, 0.4, -4, 2.3, cosmo=Planck15, max_memory=1)
+    assert np.allclose(w_chunked, w, rtol=1e-12)
+
+
+def test_angular_cf_cached_spline():
+    # Changing the angles or redshift distribution re-uses the correlation function
+    # and distances; changing the cosmology does not.
+    h = AngularCF(theta_num=10)
+    h.angular_corr_gal
+    spl, x = h._corr_gg_spline, h.xvec
+
+    h.update(theta_num=20, theta_log=False, p1=flat_z_dist(0.25, 0.35))
+    h.angular_corr_gal
+    assert h._corr_gg_spline is spl and h.xvec is x
+
+    h.update(cosmo_params={"H0": 65.0})
+    assert h._corr_gg_spline is not spl and h.xvec is not x
+
+
+def test_angular_corr_gal_z_nodes():
+    # With the same correlation function at every node, the redshift interpolation is exact.
+    xi = lambda r: k0(0.1*r)/(2*np.pi**2)
+    theta = np.logspace(-3, 0, 10)*np.pi/180
+    p = flat_z_dist(0.2, 0.4)
+    w = angular_corr_gal(theta, xi, p, 0.2, 0.4, -4, 2.3, cosmo=Planck15)
+    w_nodes = angular_corr_gal(theta, [xi]*3, p, 0.2, 0.4, -4, 2.3, cosmo=Planck15,
+                               z_nodes=np.linspace(0.2, 0.4, 3))
+    assert np.allclose(w_nodes, w, rtol=1e-10)
+
+
+def test_angular_cf_z_nodes_power():
+    # Each node shares the z=0 power of the model, rescaled by its growth factor, and
+    # agrees with a model calculated independently at that redshift.
+    z = [0.2, 0.3, 0.4]
+    h = AngularCF(z=0.3, z_nodes=z, exclusion_model="NoExclusion", sd_bias_model=None,
+                  limber_method="hankel")
+    power = h._at_z_nodes("power")
+    power_gg = h._power_gg_z
+    for i, zz in enumerate(z):
+        direct = HaloModel(z=zz, exclusion_model="NoExclusion", sd_bias_model=None)
+        assert np.allclose(power[i], direct.growth_factor ** 2 * h._power0, rtol=1e-10)
+        assert np.allclose(power_gg[i], direct.power_gg, rtol=1e-6)
+
+
+def test_distance_table():
+    z = np.linspace(0, 3, 50)
+    table = DistanceTable.get(Planck15, 3)
+    assert np.allclose(table.comoving_distance(z), Planck15.comoving_distance(z).value*Planck15.h,
+                       rtol=1e-7, atol=1e-6)
+    assert table is DistanceTable.get(Planck15, 1)
+
+
+def test_angular_power_gal():
+    a = 0.1
+    k = np.exp(np.arange(-18, 9.9, 0.05))
+    power = lambda k: 1/(k**2 + a**2)**1.5
+    ell = np.array([10.0, 100.0, 1000.0])
+    gauss = lambda mu: (lambda z: np.exp(-(z - mu)**2/(2*0.03**2))/np.sqrt(2*np.pi*0.03**2))
+    p_bins = [gauss(0.25), gauss(0.35)]
+    cl = angular_power_gal(ell, power(k), k, p_bins, 0.05, 0.6, znum=401, cosmo=Planck15)
+
+    # Direct integral in redshift, for each pair.
+    z = np.linspace(0.05, 0.6, 2001)
+    x = Planck15.comoving_distance(z).value*Planck15.h
+    dxdz = Planck15.hubble_distance.value*Planck15.h/Planck15.efunc(z)
+    for i in range(2):
+        for j in range(2):
+            integ = p_bins[i](z)*p_bins[j](z)/dxdz/x**2*power(np.outer(ell + 0.5, 1/x))
+            assert np.allclose(cl[i, j], np.trapz(integ, z), rtol=1e-3)
+
+
+def test_adaptive_r_no_exclusion():
+    h = ProjectedCF(rp_num=10, r_tol=1e-2, exclusion_model="NoExclusion", sd_bias_model=None)
+    assert np.all(np.diff(h.r) > 0)
+    assert np.isclose(h.r[-1], h.rlim)
+    assert np.all(np.isfinite(h.projected_corr_gal))
+
+
+def test_tomographic_cf():
+    h = TomographicCF(p_bins=[flat_z_dist(0.2, 0.3), flat_z_dist(0.25, 0.4)], zmin=0.2, zmax=0.4,
+                      z=0.3, ell_num=5)
+    cl = h.angular_power_gal
+    assert cl.shape == (2, 2, 5)
+    assert np.allclose(cl, cl.transpose((1, 0, 2)))
+    assert np.all(cl[[0, 1], [0, 1]] > 0)
+
+    h.update(exclusion_model="NgMatched")
+    try:
+        h.angular_power_gal
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Scale-dependent power should raise a ValueError")
@@ -0,0 +1,103 @@
+"""
+Tests of the numerical machinery underlying halo profiles, checked against
+profiles for which analytic solutions are known.
+"""
+import numpy as np
+from halomod import profiles, special
+
+
+class NumericalNFW(profiles.Profile):
+    """An NFW profile with no analytic enclosed mass, and a tabulated self-convolution."""
+    _l_tabulate = True
+
+    def _f(self, x):
+        return 1.0 / (x * (1 + x) ** 2)
+
+
+def test_h_table_array():
+    c = np.array([[0.5, 1.0, 5.0], [10.0, 30.0, 100.0]])
+    num = NumericalNFW(None, 1.0)
+    anl = profiles.NFW(None, 1.0)
+    assert num._h(c).shape == c.shape
+    assert np.allclose(num._h(c), anl._h(c), rtol=1e-6)
+
+
+def test_h_table_scalar():
+    num = NumericalNFW(None, 1.0)
+    assert np.isclose(num._h(4.0), np.log(5.0) - 0.8, rtol=1e-6)
+
+
+def test_h_table_extends():
+    num = NumericalNFW(None, 1.0)
+    c = 5e3
+    assert np.isclose(num._h(c), np.log(1 + c) - c / (1 + c), rtol=1e-6)
+
+
+
+def test_h_tables_bounded():
+    # A chain over a profile parameter keeps only the most recent tables.
+    for alpha in np.linspace(0.5, 1.5, 40):
+        profiles.GeneralizedNFW(None, 1.0, alpha=alpha)._h(5.0)
+    assert len(profiles.Profile._h_tables) <= profiles.Profile._h_tables.maxsize
+
+
+def test_cdf_numerical():
+    x = np.linspace(0, 10.0, 50)
+    num = NumericalNFW(None, 1.0)
+    anl = profiles.NFW(None, 1.0)
+    assert np.allclose(num.cdf(x, c=10.0, m=1e12, coord="x"),
+                       anl.cdf(x, c=10.0, m=1e12, coord="x"), atol=1e-8)
+
+
+def test_gnfw_inf_table_matches_nfw():
+    K = np.logspace(-2, 2, 20)
+    gnfw = profiles.GeneralizedNFWInf(None, 1.0, alpha=1.0)
+    nfw = profiles.NFWInf(None, 1.0)
+    assert np.allclose(gnfw._p(K), nfw._p(K), rtol=1e-3)
+
+
+def test_gnfw_h_matches_nfw():
+    c = np.linspace(1, 20, 10)
+    gnfw = profiles.GeneralizedNFW(None, 1.0, alpha=1.0)
+    nfw = profiles.NFW(None, 1.0)
+    assert np.allclose(gnfw._h(c), nfw._h(c), rtol=1e-6)
+
+
+def test_special_table_einasto_h():
+    c = np.logspace(-1, 2, 30)
+    exact = profiles.Einasto(None, 1.0)
+    table = profiles.Einasto(None, 1.0, special_mode="table")
+    assert np.allclose(table._h(c), exact._h(c), rtol=1e-5)
+
+
+def test_special_tables_bounded():
+    # One gamma function table per alpha, of which only the most recent are kept.
+    c = np.logspace(-1, 2, 30)
+    for alpha in np.linspace(0.15, 0.25, 30):
+        profiles.Einasto(None, 1.0, alpha=alpha, use_interp=False, special_mode="table")._h(c)
+    assert len(special._tables) <= special._tables.maxsize
+
+
+def test_lam_table_matches_nfw():
+    c = np.array([1.37, 4.4, 13.3, 55.5])
+    x = np.outer(np.linspace(0.05, 1.95, 50), c)
+    num = NumericalNFW(None, 1.0)
+    anl = profiles.NFW(None, 1.0)
+    assert num.has_lam
+    assert np.allclose(num._l_tabulated(x, c), anl._l(x, c), rtol=3e-3)
+
+
+def test_lam_table_support():
+    num = NumericalNFW(None, 1.0)
+    assert num._l_tabulated(2.5, 1.0) == 0.0
+
+
+def test_lam_table_opt_in():
+    assert not profiles.Einasto(None, 1.0).has_lam
+
+
+def test_gnfw_inf_table_small_k():
+    K = np.logspace(-10, -3, 20)
+    gnfw = profiles.GeneralizedNFWInf(None, 1.0, alpha=1.0)
+    nfw = profiles.NFWInf(None, 1.0)
+    assert np.allclose(gnfw._p(K), nfw._p(K), rtol=1e-3)
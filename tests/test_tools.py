@@ -0,0 +1,31 @@
+"""
+Tests of the transforms in tools, against pairs with analytic solutions.
+"""
+import numpy as np
+from halomod import tools
+
+
+def test_wp_fftlog():
+    # The J0 transform of k/(k^2+a^2)^(3/2) is exp(-a*rp)/a.
+    a = 0.1
+    k = np.exp(np.arange(-18, 9.9, 0.05))
+    rp = np.logspace(-2, 1.5, 20)
+    wp = tools.power_to_wp_fftlog(1/(k ** 2 + a ** 2) ** 1.5, k, rp)
+    assert np.allclose(wp, np.exp(-a*rp)/(2*np.pi*a), rtol=1e-4)
+
+
+def test_lru_cache():
+    cache = tools.LRUCache(2)
+    cache["a"] = 1
+    cache["b"] = 2
+    cache["a"]
+    cache["c"] = 3
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert len(cache) == 2
+
+
+def test_simps_weights():
+    import scipy.integrate as intg
+    for n in [5, 6]:
+        y = np.exp(np.linspace(0, 1, n))
+        assert np.isclose(np.dot(tools.simps_weights(n, 0.2), y), intg.simps(y, dx=0.2))